@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: deadline parsing with dateutil vs services.normalize
+Run this with: python benchmark_deadline_parsing.py [rows]
+"""
+
+import random
+import sys
+import timeit
+
+from dateutil import parser
+
+from services.normalize import DeadlineParser
+
+# Mixed-format corpus, roughly what several scraped sources produce
+FORMATS = [
+    ("scholarships.example.org", lambda d: d.isoformat()),
+    ("grants.example.com", lambda d: f"{d.isoformat()}T23:59:00Z"),
+    ("fellowships.example.net", lambda d: d.strftime("%B %d, %Y")),
+    ("study.example.co.uk", lambda d: d.strftime("%d %b %Y")),
+    ("jobs.example.edu", lambda d: d.strftime("%m/%d/%Y")),
+    ("funding.example.de", lambda d: d.strftime("%d.%m.%Y")),
+    ("misc.example.io", lambda d: d.strftime("%a, %d %b %Y")),  # heuristic fallback
+]
+
+def build_corpus(rows: int):
+    from datetime import date, timedelta
+
+    rng = random.Random(42)
+    start = date(2025, 1, 1)
+    corpus = []
+    for _ in range(rows):
+        source, render = rng.choice(FORMATS)
+        corpus.append((source, render(start + timedelta(days=rng.randrange(730)))))
+    return corpus
+
+def parse_with_dateutil(corpus):
+    results = []
+    for _, value in corpus:
+        try:
+            results.append(parser.parse(value).date())
+        except Exception:
+            results.append(None)
+    return results
+
+def parse_with_normalizer(corpus):
+    deadline_parser = DeadlineParser()
+    return [deadline_parser.parse(value, source) for source, value in corpus]
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    corpus = build_corpus(rows)
+
+    if parse_with_dateutil(corpus) != parse_with_normalizer(corpus):
+        print("❌ Results differ from dateutil")
+        sys.exit(1)
+
+    dateutil_time = min(timeit.repeat(lambda: parse_with_dateutil(corpus), number=1, repeat=3))
+    normalizer_time = min(timeit.repeat(lambda: parse_with_normalizer(corpus), number=1, repeat=3))
+
+    print(f"📊 {rows} mixed-format deadlines ({len(FORMATS)} sources)")
+    print(f"   dateutil:   {dateutil_time * 1000:8.1f} ms  ({rows / dateutil_time:10.0f} rows/s)")
+    print(f"   normalizer: {normalizer_time * 1000:8.1f} ms  ({rows / normalizer_time:10.0f} rows/s)")
+    print(f"✅ Speedup: {dateutil_time / normalizer_time:.1f}x (identical results)")
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,16 @@
 """Check how many opportunities are in the database"""
 
 import os
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+
+from services.db_engine import make_engine
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
 if not DATABASE_URL:
     print("ERROR: DATABASE_URL not set")
     exit(1)
 
-engine = create_engine(DATABASE_URL)
+engine = make_engine(DATABASE_URL)
 
 with engine.connect() as conn:
     result = conn.execute(text('SELECT COUNT(*) FROM opportunities'))
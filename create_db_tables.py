@@ -5,7 +5,7 @@ Run this with: python create_db_tables.py
 Make sure DATABASE_URL environment variable is set first
 """
 
-from sqlalchemy import create_engine, inspect
+from sqlalchemy import inspect
 import os
 import sys
 
@@ -25,8 +25,9 @@ if DATABASE_URL.startswith("postgres://"):
 
 print(f"📍 Connecting to database: {DATABASE_URL[:50]}...")
 
-# Create engine
-engine = create_engine(DATABASE_URL)
+# Create engine (same pool settings as the API)
+from services.db_engine import make_engine
+engine = make_engine(DATABASE_URL)
 
 # Import Base from database_setup (this contains all your models)
 try:
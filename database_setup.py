@@ -1,22 +1,88 @@
 # Database setup for Railway API
 # This file contains the database connection and schema setup
 
+import asyncio
 import os
 from sqlalchemy import (
-    create_engine, Column, Integer, String, Text, Date, DateTime, Boolean, func
+    Column, Integer, BigInteger, String, Text, Date, DateTime, Boolean, ForeignKey, Index,
+    func, text, event, inspect
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from services.db_engine import make_engine, make_async_engine, normalize_database_url
+from services.replicas import Replica, ReplicaRouter, ReplicaSession, read_urls_from_env
+
 # Get DATABASE_URL from environment
-DATABASE_URL = os.environ.get("DATABASE_URL")
+# (fixes Railway's postgres:// URLs for psycopg2 compatibility)
+DATABASE_URL = normalize_database_url(os.environ.get("DATABASE_URL"))
+
+# Create engine (pool settings: see services/db_engine.py)
+engine = make_engine(DATABASE_URL)
+
+# Async engine for the API endpoints: asyncpg for Postgres, aiosqlite locally.
+# DB_ASYNC=0 disables it; without the driver the endpoints fall back to running
+# the sync session in a worker thread (see get_async_db).
+ASYNC_DRIVERS = {
+    "postgresql": ("postgresql+asyncpg", "asyncpg"),
+    "sqlite": ("sqlite+aiosqlite", "aiosqlite"),
+}
+
+def async_database_url(url: str):
+    """Async-driver form of a sync DATABASE_URL, or None if no driver is installed"""
+    scheme, _, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect not in ASYNC_DRIVERS:
+        return None
+    async_scheme, module = ASYNC_DRIVERS[dialect]
+    try:
+        __import__(module)
+    except ImportError:
+        return None
+    return f"{async_scheme}://{rest}"
+
+async_engine = None
+AsyncSessionLocal = None
+
+DB_ASYNC = os.environ.get("DB_ASYNC", "1").lower() not in ("0", "false", "no")
 
-# Fix for Railway PostgreSQL URL (psycopg2 compatibility)
-if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+if DB_ASYNC:
+    ASYNC_DATABASE_URL = async_database_url(DATABASE_URL)
+    if ASYNC_DATABASE_URL:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
 
-# Create engine
-engine = create_engine(DATABASE_URL)
+        async_engine = make_async_engine(ASYNC_DATABASE_URL)
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Optional read replicas (DATABASE_READ_URLS) for the read-only endpoints
+def _make_replica(url: str) -> Replica:
+    url = normalize_database_url(url)
+    replica_engine = make_engine(url)
+    # Replicas use the async driver only when the primary does
+    async_url = async_database_url(url) if async_engine is not None else None
+    return Replica(
+        replica_engine.url.render_as_string(hide_password=True),
+        replica_engine,
+        make_async_engine(async_url) if async_url else None
+    )
+
+read_router = ReplicaRouter([_make_replica(url) for url in read_urls_from_env()])
+
+# SQLite has no pg_trgm: expose the same similarity functions in Python for local use
+if engine.dialect.name == "sqlite":
+    from services.trigram import similarity, word_similarity
+
+    def _register_trigram_functions(dbapi_connection, connection_record):
+        dbapi_connection.create_function("similarity", 2, similarity, deterministic=True)
+        dbapi_connection.create_function("word_similarity", 2, word_similarity, deterministic=True)
+
+    event.listen(engine, "connect", _register_trigram_functions)
+    if async_engine is not None:
+        event.listen(async_engine.sync_engine, "connect", _register_trigram_functions)
+    for replica in read_router.replicas:
+        event.listen(replica.engine, "connect", _register_trigram_functions)
+        if replica.async_engine is not None:
+            event.listen(replica.async_engine.sync_engine, "connect", _register_trigram_functions)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -27,6 +93,10 @@ Base = declarative_base()
 # Database model for Opportunity (using your existing schema)
 class Opportunity(Base):
     __tablename__ = "opportunities"
+    __table_args__ = (
+        # Serves "newest first" listings and their keyset (cursor) pagination
+        Index("ix_opportunities_created_at_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False, index=True)
@@ -36,15 +106,225 @@ class Opportunity(Base):
     location = Column(String, index=True)
     description = Column(Text)
     url = Column(String, unique=True, nullable=False)
+    canonical_url = Column(String, index=True)  # matching key, not a link (see dedupe.canonical_url)
     tags = Column(String)  # comma-separated tags
     is_verified = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    content_hash = Column(String)  # of the last scraped version (see db_service.content_hash)
+
+# Last successful refresh per scraper source and query scope (see db_service.needs_refresh)
+class RefreshState(Base):
+    __tablename__ = "refresh_state"
+
+    source = Column(String, primary_key=True)
+    scope = Column(String, primary_key=True)  # normalized "keyword|region|type", "*" for everything
+    last_success_at = Column(DateTime(timezone=True), nullable=False)
+    scraped_count = Column(Integer, default=0)
+    new_count = Column(Integer, default=0)
+
+# Cross-worker refresh lock: one row per scope being refreshed (see services/refresh_coordinator.py)
+class RefreshLease(Base):
+    __tablename__ = "refresh_leases"
+
+    scope = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)  # worker and run that holds the lease
+    acquired_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+# Validators of the last stored version of each scraped page (see services/fetch_cache.py)
+class FetchPage(Base):
+    __tablename__ = "fetch_cache"
+
+    key = Column(String, primary_key=True)  # page URL, plus the record filters applied to it
+    url = Column(String, nullable=False)
+    etag = Column(String)
+    last_modified = Column(String)  # Last-Modified header as sent by the site
+    content_hash = Column(String(64), nullable=False)  # sha256 of the body
+    checked_at = Column(DateTime(timezone=True), nullable=False)
+    changed_at = Column(DateTime(timezone=True), nullable=False)
+
+# Precomputed BM25 statistics, maintained by store_opportunities (see services/ranking.py)
+class OpportunityTerm(Base):
+    """Per-field term frequencies of one term in one opportunity"""
+    __tablename__ = "opportunity_terms"
+
+    opportunity_id = Column(Integer, ForeignKey("opportunities.id", ondelete="CASCADE"), primary_key=True)
+    term = Column(String, primary_key=True, index=True)
+    title_tf = Column(Integer, nullable=False, default=0)
+    tags_tf = Column(Integer, nullable=False, default=0)
+    description_tf = Column(Integer, nullable=False, default=0)
+
+class OpportunityDocStats(Base):
+    """Per-field token counts (document lengths) of one opportunity"""
+    __tablename__ = "opportunity_doc_stats"
+
+    opportunity_id = Column(Integer, ForeignKey("opportunities.id", ondelete="CASCADE"), primary_key=True)
+    title_len = Column(Integer, nullable=False, default=0)
+    tags_len = Column(Integer, nullable=False, default=0)
+    description_len = Column(Integer, nullable=False, default=0)
+
+# Near-duplicate detection at ingest (see services/dedupe.py)
+class OpportunitySignature(Base):
+    """64-bit SimHash of one opportunity, split into four indexed 16-bit bands"""
+    __tablename__ = "opportunity_signatures"
+
+    opportunity_id = Column(Integer, ForeignKey("opportunities.id", ondelete="CASCADE"), primary_key=True)
+    simhash = Column(BigInteger, nullable=False)  # signed
+    band0 = Column(Integer, nullable=False, index=True)
+    band1 = Column(Integer, nullable=False, index=True)
+    band2 = Column(Integer, nullable=False, index=True)
+    band3 = Column(Integer, nullable=False, index=True)
+
+class OpportunityAlias(Base):
+    """Canonical URL of a listing merged into another opportunity as its duplicate"""
+    __tablename__ = "opportunity_aliases"
+
+    url = Column(String, primary_key=True)
+    opportunity_id = Column(Integer, ForeignKey("opportunities.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# Full-text search index (weighted: title > organization/tags > type/location > description)
+# Postgres keeps a generated tsvector column in sync on every INSERT/UPDATE;
+# SQLite mirrors the same columns into an external-content FTS5 table via triggers.
+FULLTEXT_ENABLED = False
+
+POSTGRES_FULLTEXT_DDL = [
+    """
+    ALTER TABLE opportunities ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(organization, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(tags, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(type, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(location, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'D')
+    ) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_opportunities_search_vector
+    ON opportunities USING GIN (search_vector)
+    """,
+]
+
+SQLITE_FULLTEXT_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS opportunities_fts USING fts5(
+        title, organization, tags, type, location, description,
+        content='opportunities', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS opportunities_fts_ai AFTER INSERT ON opportunities BEGIN
+        INSERT INTO opportunities_fts(rowid, title, organization, tags, type, location, description)
+        VALUES (new.id, new.title, new.organization, new.tags, new.type, new.location, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS opportunities_fts_ad AFTER DELETE ON opportunities BEGIN
+        INSERT INTO opportunities_fts(opportunities_fts, rowid, title, organization, tags, type, location, description)
+        VALUES ('delete', old.id, old.title, old.organization, old.tags, old.type, old.location, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS opportunities_fts_au AFTER UPDATE ON opportunities BEGIN
+        INSERT INTO opportunities_fts(opportunities_fts, rowid, title, organization, tags, type, location, description)
+        VALUES ('delete', old.id, old.title, old.organization, old.tags, old.type, old.location, old.description);
+        INSERT INTO opportunities_fts(rowid, title, organization, tags, type, location, description)
+        VALUES (new.id, new.title, new.organization, new.tags, new.type, new.location, new.description);
+    END
+    """,
+]
+
+# Trigram indexes for typo-tolerant (fuzzy) matching on title, organization and tags
+TRIGRAM_ENABLED = False
+
+POSTGRES_TRIGRAM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_opportunities_title_trgm ON opportunities USING GIN (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_opportunities_organization_trgm ON opportunities USING GIN (organization gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_opportunities_tags_trgm ON opportunities USING GIN (tags gin_trgm_ops)",
+]
+
+def init_trigram_indexes():
+    """
+    Create the trigram indexes used by fuzzy search (idempotent)
+    Returns: True if fuzzy search is available
+    """
+    global TRIGRAM_ENABLED
+
+    dialect = engine.dialect.name
+    try:
+        if dialect == "postgresql":
+            with engine.begin() as conn:
+                for statement in POSTGRES_TRIGRAM_DDL:
+                    conn.execute(text(statement))
+            print("✅ Trigram indexes ready")
+        elif dialect == "sqlite":
+            # Served by the Python functions registered on connect (no index, local use only)
+            pass
+        else:
+            print(f"⚠️ Fuzzy search not supported on {dialect}")
+            TRIGRAM_ENABLED = False
+            return False
+        TRIGRAM_ENABLED = True
+    except Exception as e:
+        print(f"⚠️ Trigram indexes unavailable, fuzzy search disabled: {e}")
+        TRIGRAM_ENABLED = False
+    return TRIGRAM_ENABLED
+
+def init_search_indexes():
+    """
+    Create the full-text search index for the current database (idempotent)
+    Returns: True if full-text search is available
+    """
+    global FULLTEXT_ENABLED
+
+    dialect = engine.dialect.name
+    try:
+        with engine.begin() as conn:
+            if dialect == "postgresql":
+                for statement in POSTGRES_FULLTEXT_DDL:
+                    conn.execute(text(statement))
+            elif dialect == "sqlite":
+                exists = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'opportunities_fts'"
+                )).first()
+                for statement in SQLITE_FULLTEXT_DDL:
+                    conn.execute(text(statement))
+                if not exists:
+                    # Index rows that were stored before the FTS table existed
+                    conn.execute(text(
+                        "INSERT INTO opportunities_fts(opportunities_fts) VALUES ('rebuild')"
+                    ))
+            else:
+                print(f"⚠️ Full-text search not supported on {dialect}, using ILIKE search")
+                FULLTEXT_ENABLED = False
+                return False
+        FULLTEXT_ENABLED = True
+        print("✅ Full-text search index ready")
+    except Exception as e:
+        print(f"⚠️ Full-text search index unavailable, using ILIKE search: {e}")
+        FULLTEXT_ENABLED = False
+    return FULLTEXT_ENABLED
 
 # Create all tables
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
+    # create_all skips existing tables, so add columns and indexes declared since they were created
+    existing = {column["name"] for column in inspect(engine).get_columns(Opportunity.__tablename__)}
+    with engine.begin() as conn:
+        for column in Opportunity.__table__.columns:
+            if column.name not in existing:
+                conn.execute(text(
+                    f"ALTER TABLE {Opportunity.__tablename__} ADD COLUMN {column.name} "
+                    f"{column.type.compile(dialect=engine.dialect)}"
+                ))
+    for index in Opportunity.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    init_search_indexes()
+    init_trigram_indexes()
     print("✅ Database tables created successfully!")
 
 # Dependency to get database session
@@ -56,6 +336,64 @@ def get_db():
     finally:
         db.close()
 
+class ThreadedSession:
+    """
+    AsyncSession stand-in used when no async driver is available:
+    run_sync() runs the function on a regular Session in a worker thread
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await asyncio.to_thread(fn, self.sync_session, *args, **kwargs)
+
+    async def close(self):
+        await asyncio.to_thread(self.sync_session.close)
+
+def _async_session(async_factory, sync_factory):
+    return async_factory() if async_factory is not None else ThreadedSession(sync_factory())
+
+def _primary_async_session():
+    return _async_session(AsyncSessionLocal, SessionLocal)
+
+# Dependency to get an async database session
+async def get_async_db():
+    """
+    Get async database session
+    Use `await db.run_sync(fn, ...)` to run the sync service functions on it
+    """
+    db = _primary_async_session()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+def read_session_factory():
+    """Sync session factory for a read-only job: a usable replica, else the primary"""
+    replica = read_router.pick()
+    return replica.session_factory if replica is not None else SessionLocal
+
+# Dependency to get an async session for read-only endpoints
+async def get_async_read_db():
+    """
+    Get async database session on a read replica when one is usable,
+    otherwise on the primary (same interface as get_async_db)
+    """
+    replica = read_router.pick()
+    if replica is None:
+        db = _primary_async_session()
+    else:
+        db = ReplicaSession(
+            _async_session(replica.async_session_factory, replica.session_factory),
+            replica,
+            _primary_async_session
+        )
+    try:
+        yield db
+    finally:
+        await db.close()
+
 if __name__ == "__main__":
     # Run this to create tables
     init_db()
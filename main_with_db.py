@@ -1,26 +1,134 @@
 # Updated main.py with database integration
 
-from fastapi import FastAPI, Query, Depends, BackgroundTasks
+from fastapi import FastAPI, Query, Depends, BackgroundTasks, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional, Tuple
+from datetime import datetime
+import asyncio
 import os
 
 # Import database setup
-from database_setup import get_db, init_db, Opportunity, engine
+from database_setup import (
+    get_async_db, get_async_read_db, read_session_factory, init_db, engine, async_engine, SessionLocal, read_router
+)
 from services.db_service import (
-    search_opportunities_db,
-    get_all_opportunities,
-    store_opportunities,
-    needs_refresh,
-    opportunity_to_dict
+    search_opportunity_rows_async,
+    get_all_opportunity_rows_async,
+    RESULT_FIELDS,
+    SNIPPET_FIELD,
+    needs_refresh_async,
+    refresh_scope,
+    record_refresh,
+    GLOBAL_SCOPE,
+    get_refresh_states_async,
+    add_ingest_listener,
+    encode_cursor,
+    decode_cursor,
+    get_ingest_generation,
+    get_dataset_watermark_async,
+    SEARCH_MODES
 )
+from services.search_engine import memory_index, MEMORY_SEARCH_ENABLED
+from services.ranking import ensure_term_index
+from services.dedupe import ensure_signatures
+from services.query_cache import search_cache, normalize_text
+from services.http_cache import make_etag, is_not_modified, cache_headers
+from services.ingest import ingest_stream_async
+from services.db_engine import pool_stats
+from services.fast_json import records
+from services.media_types import negotiate, encode
+from services.compression import CompressionMiddleware
+from services.export import EXPORT_FORMATS, export_opportunities
+from services.refresh_coordinator import refresh_coordinator, DONE, WORKER_ID
+from services.scheduler import refresh_scheduler, REFRESH_SCHEDULER, SCHEDULED_REFRESH
+from services.snippets import make_snippet, terms_pattern
 
 # Import your existing scraper
-from services.run_scraper import scrape_opportunities
+from services.run_scraper import scrape_opportunities, stream_opportunities, commit_scraped, scraper_engine
 
 app = FastAPI(title="AIpply Opportunity Search API")
 
+# Page size used when a cursor is sent without page_size
+DEFAULT_PAGE_SIZE = 50
+
+# Modes ordered by (created_at, id), the only order keyset cursors can continue
+KEYSET_MODES = ("fulltext", "ilike")
+
+def parse_cursor(cursor: Optional[str]):
+    """Decode a cursor query parameter, rejecting malformed ones with 400"""
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def conditional_headers(request: Request, db, *key):
+    """
+    ETag / Last-Modified validators for a listing identified by key
+    Returns: (headers, not_modified)
+    """
+    watermark = await get_dataset_watermark_async(db)
+    etag = make_etag(*key, watermark["last_modified"], watermark["max_id"], watermark["count"])
+    headers = cache_headers(etag, watermark["last_modified"])
+    # JSON or MessagePack depending on Accept (see services/media_types.py)
+    headers["Vary"] = "Accept"
+    return headers, is_not_modified(request, etag, watermark["last_modified"])
+
+def paginate(results: list, page_size: int) -> Tuple[list, Optional[str]]:
+    """
+    Split a result list fetched with limit=page_size + 1 into the page and its
+    next_cursor (None on the last page). Results are db_service row tuples,
+    which end with (created_at, id), or in-memory index dicts
+    """
+    page = results[:page_size]
+    next_cursor = None
+    if len(results) > page_size and page:
+        last = page[-1]
+        if isinstance(last, dict):
+            created_at, row_id = datetime.fromisoformat(last['created_at']), last['id']
+        else:
+            created_at, row_id = last[-2], last[-1]
+        next_cursor = encode_cursor(created_at, row_id)
+    return page, next_cursor
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """Validate a fields=a,b,c parameter; every result field when omitted"""
+    if not fields:
+        return RESULT_FIELDS
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in RESULT_FIELDS and name != SNIPPET_FIELD]
+    if unknown or not names:
+        raise HTTPException(
+            status_code=400,
+            detail=f"fields must be a comma-separated list of {', '.join(RESULT_FIELDS + (SNIPPET_FIELD,))}"
+        )
+    return names
+
+def result_records(results: list, fields: Tuple[str, ...], keyword: Optional[str] = None) -> List[dict]:
+    """
+    Response objects with the requested fields; the snippet field becomes a
+    description excerpt highlighted around the keyword terms
+    """
+    if results and isinstance(results[0], dict):
+        # In-memory index rows carry every field
+        if fields == RESULT_FIELDS:
+            return results
+        opportunities = [
+            {field: row['description' if field == SNIPPET_FIELD else field] for field in fields}
+            for row in results
+        ]
+    else:
+        opportunities = records(results, fields)
+
+    if SNIPPET_FIELD in fields:
+        pattern = terms_pattern(keyword)
+        for opportunity in opportunities:
+            opportunity[SNIPPET_FIELD] = make_snippet(opportunity[SNIPPET_FIELD], pattern)
+    return opportunities
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -28,8 +136,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified"],
 )
 
+# gzip (zstd / brotli when installed) for responses of COMPRESSION_MIN_SIZE bytes or more
+app.add_middleware(CompressionMiddleware)
+
 # Initialize database on startup
 @app.on_event("startup")
 def startup_event():
@@ -40,8 +152,70 @@ def startup_event():
     except Exception as e:
         print(f"❌ Database initialization error: {e}")
 
+    try:
+        # Backfill relevance-ranking statistics for rows stored before they existed
+        db = SessionLocal()
+        try:
+            ensure_term_index(db)
+        finally:
+            db.close()
+    except Exception as e:
+        print(f"❌ Relevance index error: {e}")
+
+    try:
+        # Backfill duplicate-detection signatures for rows stored before they existed
+        db = SessionLocal()
+        try:
+            ensure_signatures(db)
+        finally:
+            db.close()
+    except Exception as e:
+        print(f"❌ Duplicate signature error: {e}")
+
+    if MEMORY_SEARCH_ENABLED:
+        # Serve /search from the in-process index, kept current by this process's
+        # ingests and by a sync thread for other processes' ingests
+        try:
+            db = SessionLocal()
+            try:
+                memory_index.load(db)
+            finally:
+                db.close()
+            add_ingest_listener(memory_index.refresh)
+            memory_index.start()
+        except Exception as e:
+            print(f"❌ In-memory search index error, using database search: {e}")
+
+    if read_router.enabled:
+        # Read-only endpoints use replicas; keep reads on the primary right after a write
+        read_router.start()
+        add_ingest_listener(read_router.note_write)
+        print(f"✅ Read replicas: {len(read_router.replicas)}")
+
+    if REFRESH_SCHEDULER == "app":
+        # Periodic scraping off the request path (see services/scheduler.py)
+        try:
+            refresh_scheduler.start()
+            print(f"✅ Refresh scheduler: {', '.join(refresh_scheduler.sources)}")
+        except Exception as e:
+            print(f"❌ Refresh scheduler error: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background threads, close pooled async connections"""
+    refresh_scheduler.stop()
+    memory_index.stop()
+    scraper_engine.close()
+    read_router.stop()
+    for replica in read_router.replicas:
+        replica.engine.dispose()
+        if replica.async_engine is not None:
+            await replica.async_engine.dispose()
+    if async_engine is not None:
+        await async_engine.dispose()
+
 @app.get("/")
-def health_check():
+async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
@@ -76,11 +250,17 @@ def create_tables_endpoint():
         }
 
 @app.get("/search")
-def search_opportunities_endpoint(
+async def search_opportunities_endpoint(
+    request: Request,
     keyword: str = Query(..., description="Search keyword (e.g., 'machine learning scholarship')"),
     region: Optional[str] = Query(None, description="Region filter (e.g., 'USA', 'Europe')"),
     type: Optional[str] = Query(None, description="Type filter (e.g., 'scholarship', 'fellowship')"),
-    db: Session = Depends(get_db),
+    mode: str = Query("fulltext", description="Match mode: 'fulltext' (indexed), 'ilike' (substring), 'fuzzy' (typo-tolerant) or 'relevance' (BM25-ranked)"),
+    similarity: float = Query(0.4, ge=0.0, le=1.0, description="Minimum similarity for mode=fuzzy"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    page_size: Optional[int] = Query(None, ge=1, le=500, description="Results per page (enables cursor pagination)"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. 'id,title,organization,deadline,snippet'"),
+    db = Depends(get_async_read_db),
     background_tasks: BackgroundTasks = None
 ):
     """
@@ -89,106 +269,326 @@ def search_opportunities_endpoint(
     - Searches database first (fast)
     - If database is stale (>6 hours), triggers background refresh
     - Returns filtered results based on keyword, region, and type
+    - Uses the full-text index by default (mode=ilike for substring matching)
+    - mode=fuzzy tolerates typos ("fulbrite") and ranks results by similarity
+    - mode=relevance ranks results by BM25 score instead of recency
+    - With page_size/cursor, returns {"results": [...], "next_cursor": ...};
+      next_cursor is always null for mode=fuzzy and mode=relevance
+    - Answers in MessagePack instead of JSON for Accept: application/msgpack
+    - fields= returns only those columns (only they are read from the database);
+      the snippet field is a short description excerpt with the terms in <mark>
+    - Answers 304 Not Modified to If-None-Match / If-Modified-Since when nothing changed
     """
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SEARCH_MODES)}")
+
+    paginated = page_size is not None or cursor is not None
+    if cursor and mode not in KEYSET_MODES:
+        raise HTTPException(status_code=400, detail=f"cursor pagination requires mode {' or '.join(KEYSET_MODES)}")
+    after = parse_cursor(cursor)
+    page_size = page_size or DEFAULT_PAGE_SIZE
+    limit = page_size + 1 if paginated else 100
+    fields = parse_fields(fields)
+    media_type = negotiate(request.headers.get("accept"))
+
     try:
-        # Check if database needs refresh
-        if needs_refresh(db, max_age_hours=6):
-            print("🔄 Database is stale, triggering background refresh...")
-            # Trigger scraping in background (non-blocking)
-            if background_tasks:
-                background_tasks.add_task(refresh_database, keyword, region, type)
-        
-        # Search from database (fast!)
-        results = search_opportunities_db(
-            keyword=keyword,
-            region=region,
-            type_filter=type,
-            db=db,
-            limit=100
+        # Check if database needs refresh (unless the scheduler keeps it fresh)
+        scope = refresh_scope(keyword, region, type)
+        if not SCHEDULED_REFRESH and await needs_refresh_async(db, max_age_hours=6, scope=scope):
+            # Trigger scraping in background (non-blocking); one refresh per scope
+            # across all workers, every other request keeps serving stored data
+            if background_tasks and refresh_coordinator.claim(scope):
+                print("🔄 Database is stale, triggering background refresh...")
+                background_tasks.add_task(
+                    refresh_coordinator.run, scope, refresh_database, keyword, region, type, max_age_hours=6
+                )
+
+        # Serve repeated queries from the cache until the next ingest
+        cache_key = (
+            "search", normalize_text(keyword), normalize_text(region), normalize_text(type),
+            mode, similarity if mode == "fuzzy" else None, cursor, limit, fields, media_type
         )
+        headers, not_modified = await conditional_headers(request, db, *cache_key)
+        if not_modified:
+            return Response(status_code=304, headers=headers)
+
+        # Bodies are stored per ETag: the generation is only bumped by ingests in
+        # this process, the ETag follows the database whoever wrote to it
+        body_key = (*cache_key, headers["ETag"])
+        generation = get_ingest_generation()
+        cached = search_cache.get(body_key, generation)
+        if cached is not None:
+            return Response(content=cached, media_type=media_type, headers=headers)
         
-        # Convert to dict format
-        opportunities = [opportunity_to_dict(opp) for opp in results]
-        
-        print(f"✅ Found {len(opportunities)} opportunities for keyword: '{keyword}'")
-        return opportunities
+        # Keyword modes are answered by the in-memory index when it is enabled
+        if memory_index.ready and mode in ("fulltext", "ilike"):
+            results = memory_index.search(keyword, region, type, limit=limit, after=after)
+            print(f"✅ Found {len(results)} opportunities for keyword: '{keyword}' (in-memory)")
+        else:
+            # Search from database: plain column tuples, no ORM objects
+            results = await search_opportunity_rows_async(
+                db,
+                keyword=keyword,
+                region=region,
+                type_filter=type,
+                limit=limit,
+                mode=mode,
+                similarity_threshold=similarity,
+                after=after,
+                fields=fields
+            )
+            
+            print(f"✅ Found {len(results)} opportunities for keyword: '{keyword}'")
+
+        if paginated:
+            page, next_cursor = paginate(results, page_size)
+            if mode not in KEYSET_MODES:
+                # Ranked modes have no keyset to continue from: page_size is only a top-k limit
+                next_cursor = None
+            payload = {"results": result_records(page, fields, keyword), "next_cursor": next_cursor}
+        else:
+            payload = result_records(results, fields, keyword)
+        body = encode(payload, media_type)
+        search_cache.put(body_key, generation, body)
+        return Response(content=body, media_type=media_type, headers=headers)
         
     except Exception as e:
         print(f"❌ Search error: {e}")
-        # Fallback to direct scraping if database fails
-        return scrape_opportunities(keyword, region, type)
+        # Fallback to direct scraping if database fails (every page, changed or not)
+        return await run_in_threadpool(scrape_opportunities, keyword, region, type, use_cache=False)
+
+@app.get("/api/admin/cache-stats")
+async def cache_stats_endpoint():
+    """
+    Search result cache counters (hits, misses, evictions)
+    Admin endpoint
+    """
+    return {
+        "search": search_cache.stats(),
+        "ingest_generation": get_ingest_generation()
+    }
+
+@app.get("/api/admin/pool-stats")
+async def pool_stats_endpoint():
+    """
+    Live connection pool counters (checked out, overflow, checkout wait time)
+    Admin endpoint
+    """
+    return {
+        "sync": pool_stats(engine),
+        "async": pool_stats(async_engine) if async_engine is not None else None,
+        "replicas": {
+            replica.name: pool_stats(replica.engine) for replica in read_router.replicas
+        }
+    }
+
+@app.get("/api/admin/replicas")
+async def replicas_endpoint():
+    """
+    Read replica health, replication lag and read routing counters
+    Admin endpoint
+    """
+    return read_router.stats()
 
 @app.get("/api/admin/opportunities")
-def get_all_opportunities_endpoint(
-    db: Session = Depends(get_db),
-    limit: int = Query(1000, description="Maximum number of results")
+async def get_all_opportunities_endpoint(
+    request: Request,
+    db = Depends(get_async_read_db),
+    limit: int = Query(1000, description="Maximum number of results"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    page_size: Optional[int] = Query(None, ge=1, le=1000, description="Results per page (enables cursor pagination)")
 ):
     """
     Get all stored opportunities from database
     Admin endpoint for viewing all data
+    With page_size/cursor, returns {"results": [...], "next_cursor": ...}
+    MessagePack instead of JSON for Accept: application/msgpack
     """
+    paginated = page_size is not None or cursor is not None
+    after = parse_cursor(cursor)
+    page_size = page_size or DEFAULT_PAGE_SIZE
+    media_type = negotiate(request.headers.get("accept"))
+
     try:
-        results = get_all_opportunities(db, limit=limit)
-        opportunities = [opportunity_to_dict(opp) for opp in results]
-        return opportunities
+        headers, not_modified = await conditional_headers(
+            request, db, "opportunities", limit, cursor, page_size if paginated else None, media_type
+        )
+        if not_modified:
+            return Response(status_code=304, headers=headers)
+
+        if paginated:
+            results = await get_all_opportunity_rows_async(db, limit=page_size + 1, after=after)
+            page, next_cursor = paginate(results, page_size)
+            payload = {"results": records(page, RESULT_FIELDS), "next_cursor": next_cursor}
+        else:
+            results = await get_all_opportunity_rows_async(db, limit=limit)
+            payload = records(results, RESULT_FIELDS)
+        return Response(content=encode(payload, media_type), media_type=media_type, headers=headers)
     except Exception as e:
         print(f"❌ Error fetching all opportunities: {e}")
         return []
 
+@app.get("/api/admin/export")
+def export_opportunities_endpoint(
+    format: str = Query("ndjson", description="'ndjson' (one JSON object per line) or 'csv'"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to export (default: all)")
+):
+    """
+    Stream the whole catalog as NDJSON or CSV
+    Rows are read through a server-side cursor and sent batch by batch,
+    so memory stays flat for any catalog size
+    Admin endpoint
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    fields = parse_fields(fields)
+    if SNIPPET_FIELD in fields:
+        raise HTTPException(status_code=400, detail="snippet is only available from /search")
+
+    return StreamingResponse(
+        export_opportunities(format, fields, read_session_factory()),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="opportunities.{format}"'}
+    )
+
+def _coordinator_status(outcome: str, result) -> dict:
+    """Response for a coordinated refresh that did not complete"""
+    messages = {
+        "busy": "A refresh of this scope is already running",
+        "fresh": "This scope was refreshed in the meantime",
+    }
+    if outcome in messages:
+        return {"status": outcome, "message": messages[outcome]}
+    return {"status": "error", "message": str(result)}
+
 @app.post("/api/admin/refresh")
-def manual_refresh_endpoint(
+async def manual_refresh_endpoint(
     keyword: Optional[str] = Query(None),
     region: Optional[str] = Query(None),
-    type: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    type: Optional[str] = Query(None)
 ):
     """
     Manually trigger database refresh by scraping
+    Answers "busy" while any worker is already refreshing the same scope
     Admin endpoint
     """
-    try:
-        # Run scraper
-        scraped_opps = scrape_opportunities(keyword, region, type)
-        
-        # Store in database
-        new_count = store_opportunities(scraped_opps, db)
-        
-        return {
-            "status": "success",
-            "scraped": len(scraped_opps),
-            "new_opportunities": new_count,
-            "message": f"Database refreshed with {new_count} new opportunities"
-        }
-    except Exception as e:
-        return {
-            "status": "error",
-            "message": str(e)
+    scope = refresh_scope(keyword, region, type)
+    if not refresh_coordinator.claim(scope):
+        return _coordinator_status("busy", None)
+
+    # Scraping is blocking I/O, kept off the event loop
+    outcome, report = await run_in_threadpool(
+        refresh_coordinator.run, scope, refresh_database, keyword, region, type
+    )
+    if outcome != DONE:
+        return _coordinator_status(outcome, report)
+
+    new_count = report["new"]
+    return {
+        "status": "success",
+        "scraped": report["scraped"],
+        "new_opportunities": new_count,
+        "updated_opportunities": report["updated"],
+        "unchanged_opportunities": report["unchanged"],
+        "merged_duplicates": report["merged"],
+        "message": f"Database refreshed with {new_count} new opportunities"
+    }
+
+@app.post("/api/admin/sync-database")
+async def sync_database_endpoint():
+    """
+    Full scrape of every source, streamed into the database chunk by chunk
+    Each chunk commits on its own, so a late failure keeps earlier chunks
+    Admin endpoint
+    """
+    if not refresh_coordinator.claim(GLOBAL_SCOPE):
+        return _coordinator_status("busy", None)
+
+    outcome, report = await run_in_threadpool(refresh_coordinator.run, GLOBAL_SCOPE, sync_database)
+    if outcome != DONE:
+        return _coordinator_status(outcome, report)
+    return {"status": "success" if not report["errors"] else "partial", **report}
+
+@app.get("/api/admin/refresh-coordinator")
+async def refresh_coordinator_endpoint():
+    """
+    Refreshes scheduled or running in this worker, leases held by any
+    worker, and how many duplicate refresh requests were collapsed
+    Admin endpoint
+    """
+    return {
+        "worker": WORKER_ID,
+        "in_flight": refresh_coordinator.in_flight(),
+        "leases": await run_in_threadpool(refresh_coordinator.leases),
+        "stats": dict(refresh_coordinator.stats)
+    }
+
+@app.get("/api/admin/refresh-status")
+async def refresh_status_endpoint(db = Depends(get_async_db)):
+    """
+    Last successful refresh per scraper source and query scope
+    Admin endpoint
+    """
+    return [
+        {
+            "source": state.source,
+            "scope": state.scope,
+            "last_success_at": state.last_success_at.isoformat() if state.last_success_at else None,
+            "scraped": state.scraped_count,
+            "new_opportunities": state.new_count
         }
+        for state in await get_refresh_states_async(db)
+    ]
 
-def refresh_database(keyword: str = None, region: str = None, type_filter: str = None):
+@app.get("/api/admin/scheduler")
+async def scheduler_endpoint():
     """
-    Background task to refresh database with fresh scraped data
+    Periodic refresh schedule: interval, backoff, next run and last outcome per source
+    Admin endpoint
     """
-    from database_setup import SessionLocal
+    return await run_in_threadpool(refresh_scheduler.status)
+
+def sync_database() -> dict:
+    """Full-catalog sync; recorded as a refresh of everything when no chunk failed"""
+    scraped = stream_opportunities()
+    # Chunks are stored while later pages are still being fetched
+    report = asyncio.run(ingest_stream_async(scraped))
+    if not report["errors"]:
+        commit_scraped(scraped)
+        db = SessionLocal()
+        try:
+            record_refresh(db, GLOBAL_SCOPE, report["received"], report["new"])
+        finally:
+            db.close()
+    return report
+
+def refresh_database(keyword: str = None, region: str = None, type_filter: str = None) -> dict:
+    """
+    Refresh database with fresh scraped data
+    Runs under refresh_coordinator (one refresh per scope at a time)
+    Returns: ingest report plus the number of scraped opportunities
+    """
+    print(f"🔄 Starting background scrape for: {keyword}")
     
-    try:
-        print(f"🔄 Starting background scrape for: {keyword}")
-        
-        # Scrape fresh opportunities
-        scraped_opps = scrape_opportunities(keyword, region, type_filter)
-        
-        # Store in database
+    # Scrape fresh opportunities, stored chunk by chunk as pages are parsed
+    scraped = stream_opportunities(keyword, region, type_filter)
+    report = asyncio.run(ingest_stream_async(scraped))
+    if not report["errors"]:
+        commit_scraped(scraped)
         db = SessionLocal()
-        new_count = store_opportunities(scraped_opps, db)
-        db.close()
-        
-        print(f"✅ Background scrape complete: {new_count} new opportunities added")
-    except Exception as e:
-        print(f"❌ Background scrape error: {e}")
+        try:
+            record_refresh(db, refresh_scope(keyword, region, type_filter), report["received"], report["new"])
+        finally:
+            db.close()
+    
+    print(
+        f"✅ Background scrape complete: {report['new']} new, {report['updated']} updated, "
+        f"{report['unchanged']} unchanged opportunities"
+    )
+    return {"scraped": report["received"], **report}
 
 # Run the app
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port)
-
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+One-time migration: fill opportunities.canonical_url for rows stored before
+the column existed, so re-scrapes under another form of their URL update them
+Stored URLs are not changed and no row is deleted
+Run this once after deploying, with DATABASE_URL set
+"""
+
+import os
+from database_setup import init_db, SessionLocal
+from services.dedupe import backfill_canonical_urls
+
+def main():
+    print("🔧 Filling canonical URLs...")
+    print(f"📍 Database URL: {os.environ.get('DATABASE_URL', 'Not set!')[:50]}...")
+
+    try:
+        # Adds the canonical_url column and its index if they are missing
+        init_db()
+        db = SessionLocal()
+        try:
+            filled, duplicates = backfill_canonical_urls(db)
+        finally:
+            db.close()
+        print(f"✅ Filled canonical URLs of {filled} opportunities")
+        if duplicates:
+            print(f"⚠️  {duplicates} canonical URLs are shared by several opportunities; "
+                  "re-scrapes update the oldest of each")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    if not os.environ.get('DATABASE_URL'):
+        print("⚠️  DATABASE_URL not set!")
+        print("Set it first: export DATABASE_URL='your-postgres-url'")
+    else:
+        main()
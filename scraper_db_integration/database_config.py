@@ -7,6 +7,29 @@ from sqlalchemy import create_engine, Column, Integer, String, Text, Date, DateT
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
+from itertools import islice
+
+try:
+    # Fast deadline parsing with per-source format memoization (AIpply web app)
+    from services.normalize import parse_deadline, source_of
+except ImportError:
+    from dateutil import parser as _dateutil_parser
+
+    def source_of(url):
+        return None
+
+    def parse_deadline(value, source=None):
+        try:
+            return _dateutil_parser.parse(value).date()
+        except (ValueError, OverflowError, TypeError):
+            return None
+
+try:
+    # Shared engine factory: pool size/overflow/recycle/pre-ping from the environment
+    from services.db_engine import make_engine
+except ImportError:
+    def make_engine(database_url):
+        return create_engine(database_url, pool_pre_ping=True, pool_recycle=1800)
 
 # Get DATABASE_URL from environment
 DATABASE_URL = os.environ.get("DATABASE_URL")
@@ -17,7 +40,7 @@ if DATABASE_URL:
     if DATABASE_URL.startswith("postgres://"):
         DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
     
-    engine = create_engine(DATABASE_URL)
+    engine = make_engine(DATABASE_URL)
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     Base = declarative_base()
     
@@ -37,6 +60,44 @@ if DATABASE_URL:
         created_at = Column(DateTime(timezone=True), server_default=func.now())
         updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    def _save_records(db, opportunities_list):
+        """Add the opportunities whose URL is not stored yet; returns how many"""
+        saved_count = 0
+        seen_urls = set()
+        
+        for opp in opportunities_list:
+            url = opp.get('url')
+            if not url or url in seen_urls:
+                continue
+            seen_urls.add(url)
+            
+            # Check if already exists
+            existing = db.query(Opportunity).filter(
+                Opportunity.url == url
+            ).first()
+            
+            if not existing:
+                # Parse deadline if string
+                deadline = opp.get('deadline')
+                if deadline and isinstance(deadline, str):
+                    deadline = parse_deadline(deadline, source_of(url))
+                
+                db_opp = Opportunity(
+                    title=opp.get('title', 'Untitled')[:200],
+                    organization=opp.get('organization', 'Unknown'),
+                    type=opp.get('type', 'opportunity'),
+                    deadline=deadline,
+                    location=opp.get('location', 'International'),
+                    description=opp.get('description', '')[:500],
+                    url=url,
+                    tags=opp.get('tags', ''),
+                    is_verified=True  # Scraped data is verified
+                )
+                db.add(db_opp)
+                saved_count += 1
+        
+        return saved_count
+    
     def save_to_database(opportunities_list):
         """
         Save scraped opportunities to database
@@ -46,43 +107,9 @@ if DATABASE_URL:
             return 0
         
         db = SessionLocal()
-        saved_count = 0
         
         try:
-            for opp in opportunities_list:
-                url = opp.get('url')
-                if not url:
-                    continue
-                
-                # Check if already exists
-                existing = db.query(Opportunity).filter(
-                    Opportunity.url == url
-                ).first()
-                
-                if not existing:
-                    # Parse deadline if string
-                    deadline = opp.get('deadline')
-                    if deadline and isinstance(deadline, str):
-                        try:
-                            from dateutil import parser
-                            deadline = parser.parse(deadline).date()
-                        except:
-                            deadline = None
-                    
-                    db_opp = Opportunity(
-                        title=opp.get('title', 'Untitled')[:200],
-                        organization=opp.get('organization', 'Unknown'),
-                        type=opp.get('type', 'opportunity'),
-                        deadline=deadline,
-                        location=opp.get('location', 'International'),
-                        description=opp.get('description', '')[:500],
-                        url=url,
-                        tags=opp.get('tags', ''),
-                        is_verified=True  # Scraped data is verified
-                    )
-                    db.add(db_opp)
-                    saved_count += 1
-            
+            saved_count = _save_records(db, opportunities_list)
             db.commit()
             if saved_count > 0:
                 print(f"✅ Auto-saved {saved_count} new opportunities to database")
@@ -95,6 +122,38 @@ if DATABASE_URL:
         finally:
             db.close()
     
+    def save_stream_to_database(opportunities, chunk_size=500):
+        """
+        Save opportunities from any iterable (e.g. a generator that yields
+        records as they are scraped) in chunks, committing each chunk.
+        Memory stays flat for full-catalog syncs, and a failure late in the
+        sync keeps every chunk committed before it.
+        Returns: {"scraped": ..., "saved": ..., "failed_chunks": ...}
+        """
+        report = {"scraped": 0, "saved": 0, "failed_chunks": 0}
+        iterator = iter(opportunities)
+        
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                break
+            report["scraped"] += len(chunk)
+            
+            db = SessionLocal()
+            try:
+                report["saved"] += _save_records(db, chunk)
+                db.commit()
+            except Exception as e:
+                print(f"❌ Database save error (chunk ending at record {report['scraped']}): {e}")
+                db.rollback()
+                report["failed_chunks"] += 1
+            finally:
+                db.close()
+        
+        if report["saved"] > 0:
+            print(f"✅ Auto-saved {report['saved']} new opportunities to database")
+        return report
+    
     DATABASE_ENABLED = True
 
 else:
@@ -103,8 +162,12 @@ else:
         print("⚠️  DATABASE_URL not set, skipping database save")
         return 0
     
+    def save_stream_to_database(opportunities, chunk_size=500):
+        print("⚠️  DATABASE_URL not set, skipping database save")
+        return {"scraped": 0, "saved": 0, "failed_chunks": 0}
+    
     DATABASE_ENABLED = False
 
 # Export
-__all__ = ['save_to_database', 'DATABASE_ENABLED']
+__all__ = ['save_to_database', 'save_stream_to_database', 'DATABASE_ENABLED']
 
@@ -5,7 +5,7 @@ Add these changes to your main.py or main_enhanced.py in AIpply-AI-Agent-Main re
 """
 
 # 1. Add this import at the top of main.py
-from database_config import save_to_database, DATABASE_ENABLED
+from database_config import save_to_database, save_stream_to_database, DATABASE_ENABLED
 
 # 2. Modify your existing search endpoint like this:
 
@@ -82,18 +82,22 @@ async def sync_database():
         return {"error": "Database not configured"}
     
     try:
-        # Scrape all sources without filters
-        all_opportunities = scrape_opportunities()
-        
-        # Save all to database
-        saved_count = save_to_database(all_opportunities)
+        # Scrape all sources without filters and save in chunks as records arrive.
+        # scrape_opportunities() returns one list of everything; a generator that
+        # scrapes one source at a time keeps only the current chunk in memory.
+        # Each chunk commits on its own.
+        def scrape_each_source():
+            for source in SOURCES:  # your scraper's sources
+                yield from scrape_source(source)  # your per-source scrape function
+
+        report = save_stream_to_database(scrape_each_source(), chunk_size=500)
         
         return {
-            "status": "success",
-            "scraped": len(all_opportunities),
-            "saved": saved_count,
-            "message": f"Synced {saved_count} new opportunities to database"
+            "status": "success" if not report["failed_chunks"] else "partial",
+            "scraped": report["scraped"],
+            "saved": report["saved"],
+            "failed_chunks": report["failed_chunks"],
+            "message": f"Synced {report['saved']} new opportunities to database"
         }
     except Exception as e:
         return {"status": "error", "message": str(e)}
-
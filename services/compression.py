@@ -0,0 +1,189 @@
+# Response compression middleware (zstd, brotli, gzip)
+#
+# The encoding is negotiated from Accept-Encoding among the codecs that are
+# installed (brotli and zstandard are optional), in COMPRESSION_ENCODINGS
+# order when the client rates several equally. Bodies smaller than
+# COMPRESSION_MIN_SIZE are sent as they are. Streaming responses are
+# compressed chunk by chunk and flushed after every chunk, so clients still
+# receive data as it is produced.
+
+import os
+import zlib
+from typing import Callable, Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from services.http_cache import parse_qvalues
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_ENCODINGS = [
+    encoding.strip()
+    for encoding in os.environ.get("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",")
+    if encoding.strip()
+]
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.environ.get("ZSTD_LEVEL", "3"))
+
+# Media types worth compressing (prefix match)
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/x-ndjson", "application/msgpack",
+    "application/x-msgpack", "application/javascript", "application/xml",
+)
+
+class _GzipEncoder:
+    def __init__(self):
+        # wbits=31: gzip container
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+class _BrotliEncoder:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+class _ZstdEncoder:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+def available_encoders() -> Dict[str, Callable]:
+    """Encoders that can be used here, in COMPRESSION_ENCODINGS order"""
+    encoders = {
+        "gzip": _GzipEncoder,
+        "br": _BrotliEncoder if brotli is not None else None,
+        "zstd": _ZstdEncoder if zstandard is not None else None,
+    }
+    return {name: encoders[name] for name in COMPRESSION_ENCODINGS if encoders.get(name)}
+
+def choose_encoding(accept_encoding: Optional[str], encodings: List[str]) -> Optional[str]:
+    """Best encoding the client accepts (highest q, server order breaks ties)"""
+    qvalues = parse_qvalues(accept_encoding)
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = qvalues.get(encoding, qvalues.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def _compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "")
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+def _weaken_etag(headers: MutableHeaders):
+    # The compressed bytes differ from the identity representation
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["etag"] = "W/" + etag
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses with the negotiated Content-Encoding"""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoders = available_encoders()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"), list(self.encoders))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _CompressingResponder(self.app, self.minimum_size, encoding, self.encoders[encoding])(
+            scope, receive, send
+        )
+
+class _CompressingResponder:
+    def __init__(self, app: ASGIApp, minimum_size: int, encoding: str, encoder_factory: Callable):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoding = encoding
+        self.encoder_factory = encoder_factory
+        self.send: Send = None
+        self.start_message: Optional[Message] = None
+        self.encoder = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk shows whether to compress
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            compressible = _compressible(Headers(raw=start["headers"]))
+            headers = MutableHeaders(raw=start["headers"])
+            if compressible:
+                headers.add_vary_header("Accept-Encoding")
+            if not compressible or (not more_body and len(body) < self.minimum_size):
+                await self.send(start)
+                await self.send(message)
+                return
+
+            headers["Content-Encoding"] = self.encoding
+            _weaken_etag(headers)
+            self.encoder = self.encoder_factory()
+            if not more_body:
+                # Whole body in one message
+                compressed = self.encoder.compress(body) + self.encoder.finish()
+                headers["Content-Length"] = str(len(compressed))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+
+            # Streaming: the length is unknown up front
+            del headers["Content-Length"]
+            await self.send(start)
+
+        if self.encoder is None:
+            await self.send(message)
+            return
+
+        chunk = self.encoder.compress(body) if body else b""
+        if not more_body:
+            chunk += self.encoder.finish()
+        if chunk or not more_body:
+            await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
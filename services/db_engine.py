@@ -0,0 +1,166 @@
+# Engine factory shared by the API, the scraper integration and the admin scripts
+#
+# Pool settings come from the environment so workers can be sized against the
+# database's connection limit (roughly: replicas x workers x (size + overflow)).
+#
+#   DB_POOL_SIZE          connections kept open per engine (default 5)
+#   DB_MAX_OVERFLOW       extra connections opened under load (default 10)
+#   DB_POOL_TIMEOUT       seconds to wait for a free connection (default 30)
+#   DB_POOL_RECYCLE       reconnect connections older than this, seconds (default 1800)
+#   DB_POOL_PRE_PING      test connections before use (default 1)
+#   DB_PGBOUNCER          1 when DATABASE_URL points at pgbouncer in transaction
+#                         mode: no client-side pool, no prepared statement cache
+
+import os
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.environ.get(name, default).lower() not in ("0", "false", "no", "")
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_flag("DB_POOL_PRE_PING", "1")
+DB_PGBOUNCER = _env_flag("DB_PGBOUNCER", "0")
+
+def normalize_database_url(url: Optional[str]) -> Optional[str]:
+    """Railway hands out postgres:// URLs; SQLAlchemy wants postgresql://"""
+    if url and url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
+
+class _PoolTimings:
+    """Checkout wait statistics shared by the instrumented pool classes"""
+
+    def _init_timings(self):
+        self._timings_lock = threading.Lock()
+        self.waiting = 0
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def _timed_get(self, get):
+        with self._timings_lock:
+            self.waiting += 1
+        started = time.perf_counter()
+        try:
+            connection = get()
+        except PoolTimeoutError:
+            with self._timings_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._timings_lock:
+                self.waiting -= 1
+        with self._timings_lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return connection
+
+    def recreate(self):
+        # Engine.dispose() swaps in a recreated pool; keep the counters
+        pool = super().recreate()
+        pool.__dict__.update({
+            name: getattr(self, name)
+            for name in ("checkouts", "wait_total", "wait_max", "timeouts")
+        })
+        return pool
+
+class InstrumentedQueuePool(_PoolTimings, QueuePool):
+    """QueuePool that records how long checkouts wait for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_timings()
+
+    def _do_get(self):
+        return self._timed_get(super()._do_get)
+
+class InstrumentedAsyncQueuePool(_PoolTimings, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long checkouts wait for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_timings()
+
+    def _do_get(self):
+        return self._timed_get(super()._do_get)
+
+def _is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def _engine_options(url, is_async: bool, overrides: dict) -> dict:
+    if _is_memory_sqlite(url):
+        # In-memory SQLite lives in a single connection; keep SQLAlchemy's pool
+        return dict(overrides)
+
+    options = {}
+    if DB_PGBOUNCER and url.get_backend_name() == "postgresql":
+        # pgbouncer does the pooling; a client-side pool would pin server connections
+        options["poolclass"] = NullPool
+        if url.get_driver_name() == "asyncpg":
+            # Prepared statements do not survive transaction-mode pooling
+            options["connect_args"] = {"statement_cache_size": 0}
+    else:
+        options.update(
+            poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+    options.update(overrides)
+    return options
+
+def make_engine(database_url: str, **overrides) -> Engine:
+    """Sync engine with the pool settings from the environment"""
+    url = make_url(normalize_database_url(database_url))
+    return create_engine(url, **_engine_options(url, False, overrides))
+
+def make_async_engine(database_url: str, **overrides):
+    """AsyncEngine with the pool settings from the environment"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = make_url(normalize_database_url(database_url))
+    if DB_PGBOUNCER and url.get_driver_name() == "asyncpg":
+        url = url.update_query_dict({"prepared_statement_cache_size": "0"})
+    return create_async_engine(url, **_engine_options(url, True, overrides))
+
+def pool_stats(engine) -> dict:
+    """Live pool counters for an Engine or AsyncEngine"""
+    engine = getattr(engine, "sync_engine", engine)
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__, "pgbouncer": DB_PGBOUNCER}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            max_overflow=pool._max_overflow,
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            timeout_seconds=pool.timeout(),
+            recycle_seconds=pool._recycle,
+            pre_ping=pool._pre_ping,
+        )
+    if isinstance(pool, _PoolTimings):
+        with pool._timings_lock:
+            stats.update(
+                waiting=pool.waiting,
+                checkouts=pool.checkouts,
+                wait_avg_ms=round(pool.wait_total / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+                wait_max_ms=round(pool.wait_max * 1000, 3),
+                timeouts=pool.timeouts,
+            )
+    return stats
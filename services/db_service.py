@@ -1,96 +1,318 @@
 # Database service for storing and retrieving opportunities
 
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
-from database_setup import Opportunity, get_db
-from typing import List, Optional
-from datetime import datetime, timedelta, date
+from sqlalchemy import or_, and_, func, literal, literal_column, text, column, tuple_, select
+from sqlalchemy.engine import Row
+import database_setup
+from database_setup import Opportunity, RefreshState
+from services import dedupe, ranking
+from services.normalize import deadline_parser, source_of
+from services.snippets import SNIPPET_SOURCE_CHARS
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+from datetime import datetime, timedelta, date, timezone
+from collections import OrderedDict
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
 
-def store_opportunities(opportunities: List[dict], db: Session) -> int:
+# Callbacks run after store_opportunities commits: listener(db, opportunity_ids)
+_ingest_listeners: List[Callable[[Session, List[int]], None]] = []
+
+def add_ingest_listener(listener: Callable[[Session, List[int]], None]):
+    """Register a callback that is told which opportunities were inserted or updated"""
+    if listener not in _ingest_listeners:
+        _ingest_listeners.append(listener)
+
+# Incremented every time store_opportunities commits; response caches compare against it
+_ingest_generation = 0
+_generation_lock = threading.Lock()
+
+def get_ingest_generation() -> int:
+    """Current ingest generation of this process"""
+    return _ingest_generation
+
+def _bump_ingest_generation():
+    global _ingest_generation
+    with _generation_lock:
+        _ingest_generation += 1
+
+def _notify_ingest(db: Session, opportunity_ids: List[int]):
+    for listener in _ingest_listeners:
+        try:
+            listener(db, opportunity_ids)
+        except Exception as e:
+            print(f"⚠️ Ingest listener {getattr(listener, '__name__', listener)} failed: {e}")
+
+# Rows per multi-row INSERT ... ON CONFLICT statement
+UPSERT_CHUNK_SIZE = 500
+
+# Columns refreshed when a scraped URL already exists (missing values keep the stored ones)
+UPSERT_UPDATE_FIELDS = ("title", "description", "type", "organization", "location", "deadline", "tags")
+
+def content_hash(row: dict) -> str:
     """
-    Store scraped opportunities in database
-    Returns: number of new opportunities added
+    Hash of a row's scraped fields (UPSERT_UPDATE_FIELDS as stored); a known
+    URL whose hash is unchanged is not written again
     """
-    new_count = 0
-    
+    values = [row.get(field) for field in UPSERT_UPDATE_FIELDS]
+    values = [value.isoformat() if isinstance(value, date) else value for value in values]
+    return hashlib.sha256(json.dumps(values, separators=(",", ":")).encode()).hexdigest()
+
+def _upsert_rows(opportunities: List[dict]) -> Tuple[List[dict], int]:
+    """
+    Column values for each storable opportunity, one per canonical URL (last one wins)
+    Returns: (rows, number of deadlines that could not be parsed)
+    """
+    rows = {}
+    invalid_deadlines = 0
     for opp_data in opportunities:
-        # Check if opportunity already exists (by URL - unique constraint)
         url = opp_data.get('url')
-        if not url:
-            continue  # Skip if no URL
-            
-        existing = db.query(Opportunity).filter(
-            Opportunity.url == url
-        ).first()
-        
-        if not existing:
-            # Parse deadline if it's a string
-            deadline_value = opp_data.get('deadline')
-            if deadline_value and isinstance(deadline_value, str):
-                try:
-                    # Try to parse common date formats
-                    from dateutil import parser
-                    deadline_value = parser.parse(deadline_value).date()
-                except:
-                    deadline_value = None  # If parsing fails, set to None
-            
-            # Create new opportunity
-            db_opp = Opportunity(
-                title=opp_data.get('title'),
-                description=opp_data.get('description'),
-                type=opp_data.get('type'),
-                organization=opp_data.get('organization'),
-                location=opp_data.get('location'),
-                deadline=deadline_value,
-                url=url,
-                tags=opp_data.get('tags', ''),
-                is_verified=False
-            )
-            db.add(db_opp)
-            new_count += 1
-        else:
-            # Update existing opportunity
-            existing.title = opp_data.get('title', existing.title)
-            existing.description = opp_data.get('description', existing.description)
-            existing.type = opp_data.get('type', existing.type)
-            existing.organization = opp_data.get('organization', existing.organization)
-            existing.location = opp_data.get('location', existing.location)
-            existing.tags = opp_data.get('tags', existing.tags)
-    
+        if not url or not opp_data.get('title'):
+            continue  # Skip if no URL (unique key) or no title (required)
+        key = dedupe.canonical_url(url)
+
+        # Parse deadline strings (format memoized per source host)
+        deadline_value = opp_data.get('deadline')
+        deadline = deadline_parser.parse(deadline_value, source_of(url))
+        if deadline is None and deadline_value:
+            invalid_deadlines += 1
+
+        rows.pop(key, None)
+        rows[key] = {
+            'title': opp_data.get('title'),
+            'description': opp_data.get('description'),
+            'type': opp_data.get('type'),
+            'organization': opp_data.get('organization'),
+            'location': opp_data.get('location'),
+            'deadline': deadline,
+            'url': url,
+            'canonical_url': key,
+            # '' only lands on insert: an empty excluded.tags keeps the stored tags
+            'tags': opp_data.get('tags') or '',
+            'is_verified': False
+        }
+        rows[key]['content_hash'] = content_hash(rows[key])
+    return list(rows.values()), invalid_deadlines
+
+def _upsert_chunk(db: Session, rows: List[dict], dialect: str):
+    """
+    One INSERT ... ON CONFLICT (url) DO UPDATE for a chunk of rows; known URLs
+    are only updated when their content hash differs, unchanged rows are not
+    returned
+    Returns: (returned rows, number of inserted rows)
+    """
+    table = Opportunity.__table__
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    stmt = insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.url],
+        set_={
+            **{field: func.coalesce(stmt.excluded[field], table.c[field]) for field in UPSERT_UPDATE_FIELDS},
+            'tags': func.coalesce(func.nullif(stmt.excluded.tags, ''), table.c.tags),
+            'canonical_url': func.coalesce(table.c.canonical_url, stmt.excluded.canonical_url),
+            'content_hash': stmt.excluded.content_hash,
+            'updated_at': func.now()
+        },
+        where=table.c.content_hash.is_distinct_from(stmt.excluded.content_hash)
+    )
+    returning = [table.c.id, table.c.title, table.c.tags, table.c.description, table.c.organization, table.c.url]
+
+    if dialect == "postgresql":
+        # xmax is 0 only for tuples created by this statement's INSERT
+        result = db.execute(stmt.returning(*returning, literal_column("(xmax = 0)").label("inserted"))).all()
+        return result, sum(1 for row in result if row.inserted)
+
+    # No xmax outside Postgres: look up which URLs already exist first
+    existing = db.query(func.count(Opportunity.id)).filter(
+        Opportunity.url.in_([row['url'] for row in rows])
+    ).scalar()
+    result = db.execute(stmt.returning(*returning)).all()
+    return result, len(rows) - existing
+
+def upsert_opportunities(opportunities: List[dict], db: Session) -> dict:
+    """
+    Store scraped opportunities in database with chunked bulk upserts
+    New URLs are inserted, known URLs get their fields refreshed when their
+    content hash changed (left untouched otherwise), and duplicates of stored
+    opportunities are merged into them (services/dedupe.py)
+    Returns: {"new": ..., "updated": ..., "unchanged": ..., "merged": ..., "skipped": ..., "invalid_deadlines": ...}
+    """
+    rows, invalid_deadlines = _upsert_rows(opportunities)
+    report = {
+        "new": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "merged": 0,
+        "skipped": len(opportunities) - len(rows),
+        "invalid_deadlines": invalid_deadlines
+    }
+    if not rows:
+        return report
+
+    dialect = db.get_bind().dialect.name
+    touched_ids = []
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        signatures = {}
+        chunk, merges = dedupe.resolve_duplicates(db, rows[start:start + UPSERT_CHUNK_SIZE], signatures)
+        returned, inserted = _upsert_chunk(db, chunk, dialect) if chunk else ([], 0)
+        report["new"] += inserted
+        report["updated"] += len(returned) - inserted
+        report["unchanged"] += len(chunk) - len(returned)
+        report["merged"] += len(merges)
+        ids_by_url = {row.url: row.id for row in returned}
+        # Merge targets within the chunk that were unchanged are not returned by the upsert
+        unreturned = {target for target, _ in merges if isinstance(target, str) and target not in ids_by_url}
+        if unreturned:
+            ids_by_url.update(db.query(Opportunity.url, Opportunity.id).filter(Opportunity.url.in_(unreturned)).all())
+        merged = dedupe.apply_merges(db, merges, ids_by_url)
+        touched = returned + merged
+        touched_ids.extend(row.id for row in touched)
+        # Keep BM25 statistics and signatures in the same transaction as the rows they describe
+        ranking.index_opportunities(db, touched)
+        dedupe.index_signatures(db, touched, signatures)
+
     db.commit()
-    return new_count
+    _bump_ingest_generation()
+    _notify_ingest(db, touched_ids)
+    return report
 
-def search_opportunities_db(
-    keyword: Optional[str] = None,
-    region: Optional[str] = None,
-    type_filter: Optional[str] = None,
-    db: Session = None,
-    limit: int = 100
-) -> List[Opportunity]:
+def store_opportunities(opportunities: List[dict], db: Session) -> int:
     """
-    Search opportunities from database with filters
+    Store scraped opportunities in database
+    Returns: number of new opportunities added
     """
-    query = db.query(Opportunity)
-    
-    # Keyword search (searches in multiple fields)
-    if keyword:
+    return upsert_opportunities(opportunities, db)["new"]
+
+SEARCH_MODES = ("fulltext", "ilike", "fuzzy", "relevance")
+
+# Default minimum trigram word similarity for mode="fuzzy"
+FUZZY_SIMILARITY_THRESHOLD = 0.4
+
+FUZZY_FIELDS = (Opportunity.title, Opportunity.organization, Opportunity.tags)
+
+def _ilike_keyword_filter(search_terms: List[str]):
+    """Substring match of every term across the searchable columns (sequential scan)"""
+    filters = []
+
+    for term in search_terms:
+        term_filter = or_(
+            Opportunity.title.ilike(f'%{term}%'),
+            Opportunity.description.ilike(f'%{term}%'),
+            Opportunity.type.ilike(f'%{term}%'),
+            Opportunity.organization.ilike(f'%{term}%'),
+            Opportunity.location.ilike(f'%{term}%'),
+            Opportunity.tags.ilike(f'%{term}%')
+        )
+        filters.append(term_filter)
+
+    # Combine all term filters (AND logic - all terms must match)
+    return and_(*filters)
+
+# Words of a search term as tsquery lexemes (tsquery operators and quotes are dropped)
+TSQUERY_WORD = re.compile(r"[^\W_]+")
+
+def prefix_tsquery(search_terms: List[str]) -> str:
+    """to_tsquery text matching every word of the terms as a prefix, like FTS5 "term"*"""
+    words = [word for term in search_terms for word in TSQUERY_WORD.findall(term)]
+    return " & ".join(f"'{word}':*" for word in words)
+
+def _fulltext_keyword_filter(search_terms: List[str], dialect: str):
+    """
+    Index-backed prefix match of every term (GIN tsvector on Postgres, FTS5 on
+    SQLite): "scholar" finds "scholarship" on both
+    """
+    if dialect == "postgresql":
+        # Stemmed prefix lexemes ANDed together, served by ix_opportunities_search_vector
+        return literal_column("opportunities.search_vector").op("@@")(
+            func.to_tsquery("english", prefix_tsquery(search_terms))
+        )
+
+    # FTS5: quoted prefix terms separated by spaces are ANDed together
+    fts_query = " ".join('"{}"*'.format(term.replace('"', '""')) for term in search_terms)
+    matches = text(
+        "SELECT rowid FROM opportunities_fts WHERE opportunities_fts MATCH :fts_query"
+    ).bindparams(fts_query=fts_query).columns(column("rowid"))
+    return Opportunity.id.in_(matches)
+
+def _fuzzy_query(query, keyword: str, dialect: str, db: Session, threshold: float):
+    """
+    Typo-tolerant match of keyword against title, organization and tags,
+    ranked by the best trigram word similarity
+    """
+    phrase = " ".join(keyword.lower().split())
+    scores = [func.word_similarity(phrase, func.coalesce(field, "")) for field in FUZZY_FIELDS]
+
+    if dialect == "postgresql":
+        # "<%" is served by the gin_trgm_ops indexes and honours this (transaction-local) threshold
+        db.execute(
+            text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+            {"threshold": str(threshold)}
+        )
+        query = query.filter(or_(*[literal(phrase).op("<%")(field) for field in FUZZY_FIELDS]))
+        score = func.greatest(*scores)
+    else:
+        query = query.filter(or_(*[s >= threshold for s in scores]))
+        score = func.max(*scores)
+
+    return query.order_by(score.desc(), Opportunity.created_at.desc())
+
+def encode_cursor(created_at: datetime, opportunity_id: int) -> str:
+    """Opaque keyset cursor pointing just after the given row"""
+    payload = json.dumps([created_at.isoformat(), opportunity_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, opportunity_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(opportunity_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def _after_cursor(query, after: Tuple[datetime, int], dialect: str):
+    """Rows strictly after the cursor in (created_at DESC, id DESC) order"""
+    created_at, opportunity_id = after
+    if dialect == "sqlite":
+        # SQLite compares datetimes as text; normalise both sides to one format
+        column_value = func.strftime("%Y-%m-%d %H:%M:%f", Opportunity.created_at)
+        cursor_value = func.strftime("%Y-%m-%d %H:%M:%f", created_at.replace(tzinfo=None).isoformat(" "))
+        return query.filter(tuple_(column_value, Opportunity.id) < tuple_(cursor_value, opportunity_id))
+    # Row comparison is served by ix_opportunities_created_at_id
+    return query.filter(tuple_(Opportunity.created_at, Opportunity.id) < tuple_(created_at, opportunity_id))
+
+def _search_query(query, keyword, region, type_filter, db: Session, mode, similarity_threshold, after):
+    """
+    Apply the search filters and ordering to an ORM query or Core select
+    Returns None when the query cannot match anything
+    """
+    dialect = db.get_bind().dialect.name
+    has_keyword = bool(keyword and keyword.strip())
+    fuzzy = mode == "fuzzy" and database_setup.TRIGRAM_ENABLED and has_keyword
+    scores = None
+
+    if mode == "relevance" and has_keyword:
+        # BM25 scores of the documents that contain every term
+        scores = ranking.bm25_scores(db, keyword)
+        if scores is None:
+            return None
+        query = query.join(scores, scores.c.opportunity_id == Opportunity.id)
+    elif keyword and not fuzzy:
+        # Keyword search (searches in multiple fields)
         search_terms = keyword.lower().split()
-        filters = []
-        
-        for term in search_terms:
-            term_filter = or_(
-                Opportunity.title.ilike(f'%{term}%'),
-                Opportunity.description.ilike(f'%{term}%'),
-                Opportunity.type.ilike(f'%{term}%'),
-                Opportunity.organization.ilike(f'%{term}%'),
-                Opportunity.location.ilike(f'%{term}%'),
-                Opportunity.tags.ilike(f'%{term}%')
-            )
-            filters.append(term_filter)
-        
-        # Combine all term filters (AND logic - all terms must match)
-        if filters:
-            query = query.filter(and_(*filters))
+        if search_terms:
+            if mode == "fulltext" and database_setup.FULLTEXT_ENABLED:
+                query = query.filter(_fulltext_keyword_filter(search_terms, dialect))
+            else:
+                query = query.filter(_ilike_keyword_filter(search_terms))
     
     # Region filter (search in location field)
     if region:
@@ -100,28 +322,281 @@ def search_opportunities_db(
     if type_filter:
         query = query.filter(Opportunity.type.ilike(f'%{type_filter}%'))
     
-    # Order by most recently created first
-    query = query.order_by(Opportunity.created_at.desc())
+    if fuzzy:
+        # Most similar first
+        query = _fuzzy_query(query, keyword, dialect, db, similarity_threshold)
+    elif scores is not None:
+        # Most relevant first, top-k computed in the database
+        query = query.order_by(scores.c.score.desc(), Opportunity.created_at.desc(), Opportunity.id.desc())
+    else:
+        if after:
+            query = _after_cursor(query, after, dialect)
+        # Order by most recently created first (id breaks ties deterministically)
+        query = query.order_by(Opportunity.created_at.desc(), Opportunity.id.desc())
     
-    return query.limit(limit).all()
+    return query
+
+def search_opportunities_db(
+    keyword: Optional[str] = None,
+    region: Optional[str] = None,
+    type_filter: Optional[str] = None,
+    db: Session = None,
+    limit: int = 100,
+    mode: str = "fulltext",
+    similarity_threshold: float = FUZZY_SIMILARITY_THRESHOLD,
+    after: Optional[Tuple[datetime, int]] = None
+) -> List[Opportunity]:
+    """
+    Search opportunities from database with filters
+
+    mode="fulltext" uses the full-text index when it is available and
+    falls back to mode="ilike" (substring match on every column) otherwise.
+    mode="fuzzy" tolerates typos in title, organization and tags and orders
+    results by similarity (requires the trigram indexes).
+    mode="relevance" returns the opportunities containing every term, best
+    BM25 score (title, tags and description) first.
+    after=(created_at, id) continues a newest-first listing (keyset pagination);
+    it is ignored by the similarity- and relevance-ordered modes.
+    """
+    query = _search_query(
+        db.query(Opportunity), keyword, region, type_filter, db, mode, similarity_threshold, after
+    )
+    return query.limit(limit).all() if query is not None else []
+
+# Columns of a search or listing result, in opportunity_to_dict order
+RESULT_FIELDS = (
+    "id", "title", "description", "type", "organization", "location",
+    "deadline", "url", "tags", "is_verified", "created_at", "updated_at"
+)
+
+# Extra selectable field: the first SNIPPET_SOURCE_CHARS of the description
+SNIPPET_FIELD = "snippet"
+
+def _result_columns(fields: Sequence[str]):
+    """
+    Columns for the requested fields, followed by the (created_at, id) keyset
+    of the row so a page can always produce its next cursor
+    """
+    columns = [
+        func.substr(Opportunity.description, 1, SNIPPET_SOURCE_CHARS).label(SNIPPET_FIELD)
+        if field == SNIPPET_FIELD else Opportunity.__table__.c[field]
+        for field in fields
+    ]
+    columns.append(Opportunity.created_at.label("cursor_created_at"))
+    columns.append(Opportunity.id.label("cursor_id"))
+    return columns
+
+def search_opportunity_rows(
+    keyword: Optional[str] = None,
+    region: Optional[str] = None,
+    type_filter: Optional[str] = None,
+    db: Session = None,
+    limit: int = 100,
+    mode: str = "fulltext",
+    similarity_threshold: float = FUZZY_SIMILARITY_THRESHOLD,
+    after: Optional[Tuple[datetime, int]] = None,
+    fields: Sequence[str] = RESULT_FIELDS
+) -> List[Row]:
+    """
+    search_opportunities_db as plain tuples of fields (Core select, only the
+    requested columns are read): no ORM objects, identity map or per-row
+    conversion. Each tuple ends with the row's (created_at, id) keyset
+    """
+    stmt = _search_query(
+        select(*_result_columns(fields)), keyword, region, type_filter, db, mode, similarity_threshold, after
+    )
+    return db.execute(stmt.limit(limit)).all() if stmt is not None else []
 
-def get_all_opportunities(db: Session, limit: int = 1000) -> List[Opportunity]:
-    """Get all opportunities"""
-    return db.query(Opportunity).order_by(
-        Opportunity.created_at.desc()
+def get_all_opportunities(
+    db: Session,
+    limit: int = 1000,
+    after: Optional[Tuple[datetime, int]] = None
+) -> List[Opportunity]:
+    """Get all opportunities (newest first, optionally after a keyset cursor)"""
+    query = db.query(Opportunity)
+    if after:
+        query = _after_cursor(query, after, db.get_bind().dialect.name)
+    return query.order_by(
+        Opportunity.created_at.desc(), Opportunity.id.desc()
     ).limit(limit).all()
 
-def needs_refresh(db: Session, max_age_hours: int = 6) -> bool:
+def get_all_opportunity_rows(
+    db: Session,
+    limit: int = 1000,
+    after: Optional[Tuple[datetime, int]] = None,
+    fields: Sequence[str] = RESULT_FIELDS
+) -> List[Row]:
+    """get_all_opportunities as plain tuples of fields plus keyset (Core select)"""
+    stmt = select(*_result_columns(fields))
+    if after:
+        stmt = _after_cursor(stmt, after, db.get_bind().dialect.name)
+    stmt = stmt.order_by(Opportunity.created_at.desc(), Opportunity.id.desc()).limit(limit)
+    return db.execute(stmt).all()
+
+# Rows fetched per round trip by stream_opportunity_rows
+EXPORT_BATCH_SIZE = 1000
+
+def stream_opportunity_rows(
+    db: Session,
+    fields: Sequence[str] = RESULT_FIELDS,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[List[Row]]:
     """
-    Check if database needs refresh (data older than max_age_hours)
+    Every opportunity in id order as batches of plain tuples of fields,
+    read through a server-side cursor (yield_per / stream_results) so only
+    one batch is held in memory at a time
     """
-    cutoff_time = datetime.utcnow() - timedelta(hours=max_age_hours)
-    recent_count = db.query(Opportunity).filter(
-        Opportunity.created_at > cutoff_time
-    ).count()
-    
-    # If no recent data, needs refresh
-    return recent_count == 0
+    stmt = select(*_result_columns(fields)).order_by(Opportunity.id)
+    result = db.execute(stmt, execution_options={"yield_per": batch_size})
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+# Dataset watermark is re-read at most this often (immediately after an ingest in this process)
+WATERMARK_TTL_SECONDS = 5
+
+_watermark_cache = None  # (ingest generation, fetched at, watermark)
+
+def get_dataset_watermark(db: Session) -> dict:
+    """
+    Latest change time, highest id and row count of the opportunities table
+    Used to build ETag / Last-Modified validators for listing responses
+    """
+    global _watermark_cache
+
+    generation = get_ingest_generation()
+    now = time.monotonic()
+    if _watermark_cache is not None:
+        cached_generation, fetched_at, watermark = _watermark_cache
+        if cached_generation == generation and now - fetched_at < WATERMARK_TTL_SECONDS:
+            return watermark
+
+    last_modified, max_id, count = db.query(
+        func.max(func.coalesce(Opportunity.updated_at, Opportunity.created_at)),
+        func.max(Opportunity.id),
+        func.count(Opportunity.id)
+    ).one()
+    if isinstance(last_modified, str):
+        # SQLite returns aggregates over datetime columns as text
+        last_modified = datetime.fromisoformat(last_modified)
+    watermark = {"last_modified": last_modified, "max_id": max_id, "count": count}
+    _watermark_cache = (generation, now, watermark)
+    return watermark
+
+# Scraper source recorded when callers don't name one
+DEFAULT_REFRESH_SOURCE = "scraper"
+
+# Scope of an unfiltered refresh; it counts as a refresh of every narrower scope
+GLOBAL_SCOPE = "*"
+
+# Refresh state is re-read from the database at most this often per scope
+REFRESH_STATE_TTL_SECONDS = 30
+
+# Scopes whose refresh state is cached (least recently used evicted first)
+REFRESH_STATE_CACHE_SIZE = int(os.environ.get("REFRESH_STATE_CACHE_SIZE", "1024"))
+
+# Refresh state of narrower scopes is deleted once this old (long stale by then)
+REFRESH_STATE_RETENTION_HOURS = float(os.environ.get("REFRESH_STATE_RETENTION_HOURS", "168"))
+
+_refresh_state_cache = OrderedDict()  # (source, scope) -> (fetched at, last_success_at)
+_refresh_state_lock = threading.Lock()
+
+def _cache_refresh_state(key: Tuple[str, str], fetched_at: float, last_success_at: Optional[datetime]):
+    with _refresh_state_lock:
+        _refresh_state_cache[key] = (fetched_at, last_success_at)
+        _refresh_state_cache.move_to_end(key)
+        while len(_refresh_state_cache) > REFRESH_STATE_CACHE_SIZE:
+            _refresh_state_cache.popitem(last=False)
+
+def refresh_scope(
+    keyword: Optional[str] = None,
+    region: Optional[str] = None,
+    type_filter: Optional[str] = None
+) -> str:
+    """Normalized scope key for a refresh of the given query"""
+    parts = [" ".join(value.lower().split()) if value else "" for value in (keyword, region, type_filter)]
+    if not any(parts):
+        return GLOBAL_SCOPE
+    return "|".join(parts)
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite returns naive datetimes; they are stored in UTC
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def get_last_refresh(
+    db: Session,
+    scope: str,
+    source: str = DEFAULT_REFRESH_SOURCE,
+    use_cache: bool = True
+) -> Optional[datetime]:
+    """Time of the last successful refresh of scope (cached in process unless use_cache=False)"""
+    key = (source, scope)
+    now = time.monotonic()
+    cached = _refresh_state_cache.get(key) if use_cache else None
+    if cached is not None and now - cached[0] < REFRESH_STATE_TTL_SECONDS:
+        return cached[1]
+
+    state = db.get(RefreshState, (source, scope))
+    last_success_at = _as_utc(state.last_success_at) if state else None
+    _cache_refresh_state(key, now, last_success_at)
+    return last_success_at
+
+def record_refresh(
+    db: Session,
+    scope: str = GLOBAL_SCOPE,
+    scraped_count: int = 0,
+    new_count: int = 0,
+    source: str = DEFAULT_REFRESH_SOURCE
+):
+    """Persist a successful refresh of scope so other requests and workers see it"""
+    now = datetime.now(timezone.utc)
+    state = db.get(RefreshState, (source, scope))
+    if state is None:
+        state = RefreshState(source=source, scope=scope)
+        db.add(state)
+    state.last_success_at = now
+    state.scraped_count = scraped_count
+    state.new_count = new_count
+    # On-demand refreshes leave one row per searched scope; drop the long-stale ones
+    db.query(RefreshState).filter(
+        RefreshState.scope != GLOBAL_SCOPE,
+        RefreshState.last_success_at < now - timedelta(hours=REFRESH_STATE_RETENTION_HOURS)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+    _cache_refresh_state((source, scope), time.monotonic(), now)
+
+def needs_refresh(
+    db: Session,
+    max_age_hours: int = 6,
+    scope: str = GLOBAL_SCOPE,
+    source: str = DEFAULT_REFRESH_SOURCE,
+    use_cache: bool = True
+) -> bool:
+    """
+    Check if scope needs refresh (no successful refresh of it, or of
+    everything, within max_age_hours). Usually answered without a query;
+    use_cache=False reads what other workers recorded just now. The global
+    refresh is checked first, so while it is fresh narrower scopes are not
+    looked up (or cached) at all.
+    """
+    cutoff_time = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
+    last_global = get_last_refresh(db, GLOBAL_SCOPE, source, use_cache)
+    if last_global is not None and last_global >= cutoff_time:
+        return False
+    if scope == GLOBAL_SCOPE:
+        return True
+
+    # If no recent refresh, needs refresh
+    last = get_last_refresh(db, scope, source, use_cache)
+    return last is None or last < cutoff_time
+
+def get_refresh_states(db: Session) -> List[RefreshState]:
+    """All recorded refreshes, most recent first"""
+    return db.query(RefreshState).order_by(RefreshState.last_success_at.desc()).all()
 
 def opportunity_to_dict(opp: Opportunity) -> dict:
     """Convert database model to dictionary"""
@@ -140,3 +615,27 @@ def opportunity_to_dict(opp: Opportunity) -> dict:
         'updated_at': opp.updated_at.isoformat() if opp.updated_at else None
     }
 
+
+# Async entry points used by the API endpoints. Each runs the function above on
+# an AsyncSession (no thread per query) or, without an async driver, on the
+# database_setup.ThreadedSession fallback.
+
+async def search_opportunity_rows_async(db, **kwargs) -> List[Row]:
+    """Async search_opportunity_rows (same keyword arguments)"""
+    return await db.run_sync(lambda session: search_opportunity_rows(db=session, **kwargs))
+
+async def get_all_opportunity_rows_async(db, **kwargs) -> List[Row]:
+    """Async get_all_opportunity_rows"""
+    return await db.run_sync(get_all_opportunity_rows, **kwargs)
+
+async def needs_refresh_async(db, **kwargs) -> bool:
+    """Async needs_refresh"""
+    return await db.run_sync(needs_refresh, **kwargs)
+
+async def get_dataset_watermark_async(db) -> dict:
+    """Async get_dataset_watermark"""
+    return await db.run_sync(get_dataset_watermark)
+
+async def get_refresh_states_async(db) -> List[RefreshState]:
+    """Async get_refresh_states"""
+    return await db.run_sync(get_refresh_states)
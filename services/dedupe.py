@@ -0,0 +1,382 @@
+# Ingest-time de-duplication of opportunities
+#
+# Scraped URLs are stored as they were published. Their canonical form
+# (opportunities.canonical_url) is what re-scrapes are matched on: scheme and
+# host case, "www.", default ports, fragments, tracking parameters, parameter
+# order and trailing slashes no longer make a new row.
+#
+# The same listing published under another URL (aggregator mirrors, reposts)
+# is caught by a 64-bit SimHash of title, organization and description. The
+# signature is stored as four indexed 16-bit bands; two signatures within
+# NEAR_DUPLICATE_DISTANCE (<= 3) bits share at least one band, so candidates
+# are found with indexed equality lookups however large the catalog. A
+# candidate is only taken when its title is similar too and the deadlines do
+# not conflict (sibling listings share most of their description).
+#
+# A near-duplicate is not inserted: it fills fields the stored opportunity is
+# missing, and its URL goes into opportunity_aliases, so later scrapes of that
+# URL are merged into the stored opportunity without a signature lookup.
+#
+# Rows stored before the canonical_url column existed are matched on their
+# exact URL until the one-time migration fills it in (migrate_canonical_urls.py).
+
+import hashlib
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
+
+from sqlalchemy import String, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from database_setup import Opportunity, OpportunityAlias, OpportunitySignature
+
+DEDUPE_NEAR_DUPLICATES = os.environ.get("DEDUPE_NEAR_DUPLICATES", "1") == "1"
+
+# Largest SimHash Hamming distance of a near-duplicate (at most 3: four bands)
+NEAR_DUPLICATE_DISTANCE = min(int(os.environ.get("NEAR_DUPLICATE_DISTANCE", "3")), 3)
+
+# Smallest title token overlap (Jaccard) of a near-duplicate
+NEAR_DUPLICATE_TITLE_SIMILARITY = float(os.environ.get("NEAR_DUPLICATE_TITLE_SIMILARITY", "0.8"))
+
+# Query parameters that only track the visit
+TRACKING_PARAMS = {
+    "gclid", "dclid", "fbclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "_ga", "_gl", "_hsenc", "_hsmi", "ref", "ref_src", "trk", "spm",
+}
+TRACKING_PREFIXES = ("utm_",)
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# SimHash feature weights per field, and the description prefix that is hashed
+SIGNATURE_WEIGHTS = {"title": 3, "organization": 2, "description": 1}
+SIGNATURE_DESCRIPTION_CHARS = 2000
+
+BANDS = 4
+BAND_BITS = 16
+
+# The 64 SimHash bit counters are packed into one integer, COUNTER_BITS each,
+# so a feature is added with one multiply-add instead of 64 Python additions
+COUNTER_BITS = 24
+COUNTER_MASK = (1 << COUNTER_BITS) - 1
+_SPREAD_BYTE = [
+    sum(1 << (bit * COUNTER_BITS) for bit in range(8) if value >> bit & 1)
+    for value in range(256)
+]
+
+# Filled from a near-duplicate when the stored opportunity has no value
+MERGE_FIELDS = ("description", "type", "organization", "location", "deadline", "tags")
+
+def canonical_url(url: str) -> str:
+    """
+    Canonical form of a listing URL: the key re-scrapes are matched on, not a
+    link to show (lowercase scheme and host, no "www.", default port, tracking
+    parameters or fragment; the scheme itself is kept)
+    """
+    url = url.strip()
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return url
+
+    host = parts.hostname.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    port = parts.port
+    if port and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+
+    path = re.sub(r"/{2,}", "/", parts.path)
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    return urlunsplit((scheme, host, path or "/", urlencode(query, quote_via=quote), ""))
+
+def _tokens(value: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(value.lower()) if value else []
+
+def simhash(title: Optional[str], organization: Optional[str], description: Optional[str]) -> int:
+    """64-bit SimHash over word pairs of the weighted fields"""
+    fields = {
+        "title": title,
+        "organization": organization,
+        "description": (description or "")[:SIGNATURE_DESCRIPTION_CHARS],
+    }
+    features = Counter()
+    for field, value in fields.items():
+        tokens = _tokens(value)
+        shingles = [" ".join(pair) for pair in zip(tokens, tokens[1:])] or tokens
+        for shingle in shingles:
+            features[shingle] += SIGNATURE_WEIGHTS[field]
+
+    counters = 0
+    total = 0
+    for feature, weight in features.items():
+        # blake2b: stable across processes, unlike hash()
+        digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+        spread = 0
+        for index, byte in enumerate(digest):
+            spread |= _SPREAD_BYTE[byte] << (index * 8 * COUNTER_BITS)
+        counters += weight * spread
+        total += weight
+    # A bit is set when the features with it set outweigh those without
+    return sum(
+        1 << bit for bit in range(64)
+        if 2 * (counters >> (bit * COUNTER_BITS) & COUNTER_MASK) > total
+    )
+
+def _signature(title: Optional[str], organization: Optional[str], description: Optional[str], memo: Optional[dict]) -> int:
+    # The rows signed for lookup are signed again when stored
+    if memo is None:
+        return simhash(title, organization, description)
+    key = (title, organization, description)
+    if key not in memo:
+        memo[key] = simhash(title, organization, description)
+    return memo[key]
+
+def bands(signature: int) -> List[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [signature >> (band * BAND_BITS) & mask for band in range(BANDS)]
+
+def _signed(signature: int) -> int:
+    # BIGINT is signed
+    return signature - (1 << 64) if signature >= 1 << 63 else signature
+
+def _unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+def title_similarity(a: Optional[str], b: Optional[str]) -> float:
+    """Jaccard overlap of the title word sets"""
+    a_tokens, b_tokens = set(_tokens(a)), set(_tokens(b))
+    if not a_tokens or not b_tokens:
+        return 0.0
+    return len(a_tokens & b_tokens) / len(a_tokens | b_tokens)
+
+def _same_listing(row: dict, signature: int, candidate: dict) -> bool:
+    if hamming(signature, candidate["simhash"]) > NEAR_DUPLICATE_DISTANCE:
+        return False
+    if row.get("deadline") and candidate["deadline"] and row["deadline"] != candidate["deadline"]:
+        return False
+    return title_similarity(row["title"], candidate["title"]) >= NEAR_DUPLICATE_TITLE_SIMILARITY
+
+def _candidates(db: Session, signatures: List[int]) -> List[dict]:
+    """Stored opportunities sharing at least one band with any of signatures"""
+    if not signatures:
+        return []
+    band_values = [set() for _ in range(BANDS)]
+    for signature in signatures:
+        for band, value in enumerate(bands(signature)):
+            band_values[band].add(value)
+    columns = [OpportunitySignature.band0, OpportunitySignature.band1, OpportunitySignature.band2, OpportunitySignature.band3]
+    rows = db.execute(
+        select(OpportunitySignature.opportunity_id, OpportunitySignature.simhash, Opportunity.url, Opportunity.title, Opportunity.deadline)
+        .join(Opportunity, Opportunity.id == OpportunitySignature.opportunity_id)
+        .where(or_(*(column.in_(values) for column, values in zip(columns, band_values))))
+    ).all()
+    return [
+        {"id": row.opportunity_id, "simhash": _unsigned(row.simhash), "url": row.url, "title": row.title, "deadline": row.deadline}
+        for row in rows
+    ]
+
+def resolve_duplicates(
+    db: Session,
+    rows: List[dict],
+    memo: Optional[dict] = None
+) -> Tuple[List[dict], List[Tuple[Union[int, str], dict]]]:
+    """
+    Split upsert rows into rows to upsert and merges: (opportunity id, or
+    URL of an earlier row of the same batch, duplicate row)
+    A row matching a stored opportunity on its canonical URL takes over that
+    opportunity's URL, so the upsert updates it
+    memo keeps the computed signatures for index_signatures
+    """
+    urls = [row["url"] for row in rows]
+    keys = [row["canonical_url"] for row in rows]
+    # Aliases recorded before canonical_url existed hold the scraped URL
+    aliased = dict(db.execute(
+        select(OpportunityAlias.url, OpportunityAlias.opportunity_id).where(OpportunityAlias.url.in_(keys + urls))
+    ).all())
+    stored = set(db.scalars(select(Opportunity.url).where(Opportunity.url.in_(urls))))
+    # Newest first, so the oldest row wins where several share a canonical URL
+    by_key = dict(db.execute(
+        select(Opportunity.canonical_url, Opportunity.url)
+        .where(Opportunity.canonical_url.in_(keys))
+        .order_by(Opportunity.id.desc())
+    ).all())
+
+    keep, merges, fresh = [], [], []
+    for row in rows:
+        alias = aliased.get(row["canonical_url"], aliased.get(row["url"]))
+        if row["url"] not in stored and row["canonical_url"] in by_key:
+            row["url"] = by_key[row["canonical_url"]]
+            stored.add(row["url"])
+        if alias is not None:
+            merges.append((alias, row))
+        elif row["url"] in stored or not DEDUPE_NEAR_DUPLICATES:
+            keep.append(row)
+        else:
+            fresh.append(row)
+    if not fresh:
+        return keep, merges
+
+    signatures = [_signature(row["title"], row["organization"], row["description"], memo) for row in fresh]
+    by_band: List[Dict[int, List[dict]]] = [{} for _ in range(BANDS)]
+
+    def add_candidate(candidate: dict):
+        for band, value in enumerate(bands(candidate["simhash"])):
+            by_band[band].setdefault(value, []).append(candidate)
+
+    for candidate in _candidates(db, signatures):
+        add_candidate(candidate)
+
+    for row, signature in zip(fresh, signatures):
+        match = None
+        for band, value in enumerate(bands(signature)):
+            match = next((c for c in by_band[band].get(value, ()) if _same_listing(row, signature, c)), None)
+            if match:
+                break
+        if match is None:
+            keep.append(row)
+            # Later rows of this batch can be duplicates of this one
+            add_candidate({"id": None, "simhash": signature, "url": row["url"], "title": row["title"], "deadline": row.get("deadline")})
+        else:
+            merges.append((match["id"] if match["id"] is not None else match["url"], row))
+    return keep, merges
+
+def fill_values(fills: dict) -> dict:
+    """
+    SET values filling each field only where the stored value is missing:
+    NULL, or '' in text columns ('' is no valid DATE on Postgres)
+    """
+    table = Opportunity.__table__
+    values = {}
+    for field, value in fills.items():
+        column = table.c[field]
+        stored = func.nullif(column, "") if isinstance(column.type, String) else column
+        values[field] = func.coalesce(stored, value)
+    return values
+
+def _fill_missing(db: Session, opportunity_id: int, row: dict):
+    """Fill the opportunity's NULL or empty fields from row. Returns: the updated row, if any"""
+    table = Opportunity.__table__
+    fills = {field: row[field] for field in MERGE_FIELDS if row.get(field) not in (None, "")}
+    if not fills:
+        return None
+    return db.execute(
+        update(table)
+        .where(table.c.id == opportunity_id)
+        # Stored values win; missing ones are filled
+        .values(fill_values(fills))
+        .returning(table.c.id, table.c.title, table.c.tags, table.c.description, table.c.organization, table.c.url)
+    ).first()
+
+def apply_merges(db: Session, merges: List[Tuple[Union[int, str], dict]], ids_by_url: Dict[str, int]) -> list:
+    """
+    Fill missing fields of each merge target and alias the duplicate's URL to it
+    Runs inside the caller's transaction. Returns: the updated opportunity rows
+    """
+    updated = []
+    aliases = {}
+    for target, row in merges:
+        opportunity_id = target if isinstance(target, int) else ids_by_url.get(target)
+        if opportunity_id is None:
+            continue
+        result = _fill_missing(db, opportunity_id, row)
+        if result is not None:
+            updated.append(result)
+        if row["url"] not in ids_by_url:
+            aliases[row["canonical_url"]] = opportunity_id
+
+    if aliases:
+        existing = set(db.scalars(select(OpportunityAlias.url).where(OpportunityAlias.url.in_(list(aliases)))))
+        db.add_all(
+            OpportunityAlias(url=url, opportunity_id=opportunity_id)
+            for url, opportunity_id in aliases.items() if url not in existing
+        )
+    return updated
+
+def index_signatures(db: Session, opportunities: list, memo: Optional[dict] = None):
+    """
+    (Re)compute signatures of the given opportunities (rows with id, title,
+    organization and description). Runs inside the caller's transaction
+    """
+    opportunities = list({opp.id: opp for opp in opportunities}.values())
+    ids = [opp.id for opp in opportunities]
+    if not ids:
+        return
+    db.query(OpportunitySignature).filter(OpportunitySignature.opportunity_id.in_(ids)).delete(synchronize_session=False)
+    rows = []
+    for opp in opportunities:
+        signature = _signature(opp.title, opp.organization, opp.description, memo)
+        rows.append({
+            "opportunity_id": opp.id,
+            "simhash": _signed(signature),
+            **{f"band{band}": value for band, value in enumerate(bands(signature))},
+        })
+    db.execute(OpportunitySignature.__table__.insert(), rows)
+
+def ensure_signatures(db: Session, batch_size: int = 500) -> int:
+    """
+    Sign opportunities that have no signature yet (e.g. rows stored before
+    de-duplication existed). Returns the number of opportunities signed
+    """
+    signed = 0
+    while True:
+        batch = db.query(Opportunity).filter(
+            ~Opportunity.id.in_(db.query(OpportunitySignature.opportunity_id))
+        ).limit(batch_size).all()
+        if not batch:
+            break
+        index_signatures(db, batch)
+        db.commit()
+        signed += len(batch)
+    if signed:
+        print(f"✅ Signed {signed} opportunities for duplicate detection")
+    return signed
+
+def backfill_canonical_urls(db: Session, batch_size: int = 1000) -> Tuple[int, int]:
+    """
+    Fill canonical_url of rows stored before the column existed. Stored URLs
+    are left as they are and no row is deleted; canonical groups holding more
+    than one opportunity are only counted (re-scrapes of such a group update
+    its oldest row). Returns: (filled, duplicate groups)
+    """
+    filled = 0
+    last_id = 0
+    while True:
+        batch = db.execute(
+            select(Opportunity.id, Opportunity.url)
+            .where(Opportunity.id > last_id, Opportunity.canonical_url.is_(None))
+            .order_by(Opportunity.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+        db.execute(
+            update(Opportunity),
+            [{"id": row.id, "canonical_url": canonical_url(row.url)} for row in batch]
+        )
+        db.commit()
+        filled += len(batch)
+
+    duplicates = db.scalar(
+        select(func.count()).select_from(
+            select(Opportunity.canonical_url)
+            .where(Opportunity.canonical_url.is_not(None))
+            .group_by(Opportunity.canonical_url)
+            .having(func.count() > 1)
+            .subquery()
+        )
+    )
+    return filled, duplicates
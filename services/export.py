@@ -0,0 +1,63 @@
+# Streaming catalog export (NDJSON / CSV)
+#
+# Rows come from db_service.stream_opportunity_rows (server-side cursor) and are
+# encoded one batch at a time, so memory stays flat whatever the catalog size
+# and the client starts receiving data after the first batch.
+
+import csv
+import io
+from datetime import date
+from typing import Callable, Iterable, Iterator, List, Sequence
+
+from sqlalchemy.orm import Session
+
+from services.db_service import EXPORT_BATCH_SIZE, stream_opportunity_rows
+from services.fast_json import dumps
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+def _ndjson_chunks(batches: Iterable[List[Sequence]], fields: Sequence[str]) -> Iterator[bytes]:
+    for batch in batches:
+        yield b"".join(dumps(dict(zip(fields, row))) + b"\n" for row in batch)
+
+def _csv_value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+def _csv_chunks(batches: Iterable[List[Sequence]], fields: Sequence[str]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    width = len(fields)
+    for batch in batches:
+        writer.writerows([_csv_value(value) for value in row[:width]] for row in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()  # header of an empty export
+
+def export_opportunities(
+    export_format: str,
+    fields: Sequence[str],
+    session_factory: Callable[[], Session],
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[bytes]:
+    """
+    Encoded chunks of the whole catalog, one per batch of rows
+    The session lives as long as the iterator (i.e. the response)
+    """
+    encode = _ndjson_chunks if export_format == "ndjson" else _csv_chunks
+    db = session_factory()
+    try:
+        yield from encode(stream_opportunity_rows(db, fields, batch_size), fields)
+    except Exception as e:
+        # Headers are already sent; the client sees a truncated export
+        print(f"❌ Export failed: {e}")
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,29 @@
+# JSON encoding for the hot read paths (/search, admin listing)
+#
+# Result rows are plain column tuples; they are zipped with their field names
+# and encoded straight to bytes. orjson serializes date/datetime natively (same
+# text as isoformat()); without it the stdlib encoder is used.
+
+import json
+from datetime import date
+from typing import Iterable, List, Sequence
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value) -> bytes:
+    """JSON bytes for value (dates and datetimes as ISO 8601 strings)"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+def records(rows: Iterable[Sequence], fields: Sequence[str]) -> List[dict]:
+    """Field-name objects for result tuples, values left as fetched"""
+    return [dict(zip(fields, row)) for row in rows]
@@ -0,0 +1,118 @@
+# Persistent conditional-fetch cache of scraped pages
+#
+# For every page the scraper has stored, fetch_cache keeps the ETag and
+# Last-Modified validators and a sha256 of the body. The next fetch sends
+# If-None-Match / If-Modified-Since; a 304, or a 200 whose body hashes the
+# same, marks the page unchanged and it is neither parsed nor stored again.
+#
+# Entries are only written by save(), which callers run after the scraped
+# records were stored: if storing fails the pages are fetched and stored again
+# next time instead of being skipped as unchanged.
+
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from database_setup import FetchPage, SessionLocal
+
+SCRAPER_FETCH_CACHE = os.environ.get("SCRAPER_FETCH_CACHE", "1") == "1"
+
+# Keys per SELECT ... WHERE key IN (...), rows per INSERT
+BATCH_SIZE = 500
+
+def content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+def cache_key(url: str, filters: Optional[dict] = None) -> str:
+    """
+    Key of a page: its URL, plus the record filters applied after parsing
+    (the same page stores different records under different filters)
+    """
+    if not filters:
+        return url
+    return url + " " + json.dumps(filters, sort_keys=True)
+
+def _insert(dialect: str):
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+class FetchCache:
+    """Validators and content hashes of stored pages"""
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+
+    def load(self, keys: Iterable[str]) -> Dict[str, dict]:
+        """Cached entries by key (keys never stored are missing)"""
+        keys = list(dict.fromkeys(keys))
+        entries = {}
+        db = self.session_factory()
+        try:
+            for start in range(0, len(keys), BATCH_SIZE):
+                pages = db.query(FetchPage).filter(FetchPage.key.in_(keys[start:start + BATCH_SIZE]))
+                for page in pages:
+                    entries[page.key] = {
+                        "etag": page.etag,
+                        "last_modified": page.last_modified,
+                        "content_hash": page.content_hash,
+                    }
+        finally:
+            db.close()
+        return entries
+
+    def save(self, pages: List[dict]):
+        """
+        Upsert fetched pages: {"key", "url", "etag", "last_modified",
+        "content_hash", "changed"} (changed=False keeps changed_at)
+        """
+        if not pages:
+            return
+        now = datetime.now(timezone.utc)
+        table = FetchPage.__table__
+        db = self.session_factory()
+        try:
+            insert = _insert(db.get_bind().dialect.name)
+            # Changed and unchanged pages differ only in whether changed_at moves
+            for changed in (True, False):
+                rows = [
+                    {
+                        "key": page["key"],
+                        "url": page["url"],
+                        "etag": page["etag"],
+                        "last_modified": page["last_modified"],
+                        "content_hash": page["content_hash"],
+                        "checked_at": now,
+                        "changed_at": now,
+                    }
+                    for page in pages if page["changed"] == changed
+                ]
+                for start in range(0, len(rows), BATCH_SIZE):
+                    stmt = insert(table).values(rows[start:start + BATCH_SIZE])
+                    updates = {
+                        "etag": stmt.excluded.etag,
+                        "last_modified": stmt.excluded.last_modified,
+                        "content_hash": stmt.excluded.content_hash,
+                        "checked_at": stmt.excluded.checked_at,
+                    }
+                    if changed:
+                        updates["changed_at"] = stmt.excluded.changed_at
+                    db.execute(stmt.on_conflict_do_update(index_elements=[table.c.key], set_=updates))
+            db.commit()
+        finally:
+            db.close()
+
+    def clear(self):
+        """Forget every page, so the next refresh fetches and stores everything"""
+        db = self.session_factory()
+        try:
+            db.query(FetchPage).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
@@ -0,0 +1,80 @@
+# HTTP conditional request helpers (ETag / Last-Modified -> 304 Not Modified)
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from fastapi import Request
+
+def make_etag(*parts) -> str:
+    """Strong ETag derived from the given values"""
+    digest = hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite returns naive datetimes; they are stored in UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def http_date(value: datetime) -> str:
+    """Format a datetime for the Last-Modified header"""
+    return format_datetime(_as_utc(value).replace(microsecond=0), usegmt=True)
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as required for If-None-Match
+    candidates = [tag.strip() for tag in header.split(",")]
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any((tag[2:] if tag.startswith("W/") else tag) == opaque for tag in candidates)
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """
+    True when the client's cached copy is still current
+    If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return _as_utc(last_modified).replace(microsecond=0) <= since
+    return False
+
+def cache_headers(etag: str, last_modified: Optional[datetime]) -> dict:
+    """Validator headers for a response; clients must revalidate before reuse"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+def parse_qvalues(header: Optional[str]) -> Dict[str, float]:
+    """
+    Token -> quality for an Accept / Accept-Encoding header
+    ("gzip, br;q=0.8" -> {"gzip": 1.0, "br": 0.8}); parameters other than q are ignored
+    """
+    qvalues: Dict[str, float] = {}
+    for item in (header or "").split(","):
+        token, *params = [part.strip() for part in item.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        token = token.lower()
+        qvalues[token] = max(q, qvalues.get(token, 0.0))
+    return qvalues
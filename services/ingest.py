@@ -0,0 +1,229 @@
+# Streaming ingestion of scraped opportunities
+#
+# Records are consumed lazily from an iterator (or async iterator), normalized,
+# de-duplicated and upserted in fixed-size chunks. Every chunk is committed in
+# its own session, so memory stays flat whatever the catalog size and a failure
+# late in a sync only loses the chunk that failed.
+
+import asyncio
+import os
+from collections import OrderedDict
+from typing import AsyncIterable, Callable, Iterable, Iterator, List, Optional, Union
+
+from sqlalchemy.orm import Session
+
+from database_setup import SessionLocal
+from services.db_service import upsert_opportunities
+from services.dedupe import canonical_url
+
+# Records per chunk (one transaction each)
+INGEST_CHUNK_SIZE = int(os.environ.get("INGEST_CHUNK_SIZE", "500"))
+
+# Chunks an async producer may get ahead of the database writer
+INGEST_QUEUE_CHUNKS = int(os.environ.get("INGEST_QUEUE_CHUNKS", "2"))
+
+# URLs remembered for cross-chunk de-duplication (oldest forgotten first)
+INGEST_DEDUPE_WINDOW = int(os.environ.get("INGEST_DEDUPE_WINDOW", "50000"))
+
+# Errors kept in the report
+MAX_REPORTED_ERRORS = 10
+
+STRING_FIELDS = ("title", "description", "type", "organization", "location", "url", "tags", "deadline")
+
+def normalize_record(record: dict) -> Optional[dict]:
+    """Trimmed copy of a scraped record, or None if it cannot be stored"""
+    if not isinstance(record, dict):
+        return None
+
+    normalized = dict(record)
+    for field in STRING_FIELDS:
+        value = normalized.get(field)
+        if isinstance(value, str):
+            normalized[field] = value.strip() or None
+    if not normalized.get("url") or not normalized.get("title"):
+        return None
+    return normalized
+
+class _RecentUrls:
+    """Bounded set of recently ingested URLs"""
+
+    def __init__(self, max_size: int = INGEST_DEDUPE_WINDOW):
+        self.max_size = max_size
+        self._urls = OrderedDict()
+
+    def add(self, url: str) -> bool:
+        """Remember url; False if it was already seen"""
+        if url in self._urls:
+            self._urls.move_to_end(url)
+            return False
+        self._urls[url] = None
+        if len(self._urls) > self.max_size:
+            self._urls.popitem(last=False)
+        return True
+
+def _new_report() -> dict:
+    return {
+        "received": 0,
+        "new": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "merged": 0,
+        "skipped": 0,
+        "duplicates": 0,
+        "invalid_deadlines": 0,
+        "chunks": 0,
+        "failed_chunks": 0,
+        "errors": [],
+    }
+
+def _source_failed(report: dict, error: Exception):
+    # Keep everything read so far; report the broken source
+    report["errors"].append(f"source: {error}")
+    print(f"❌ Ingest source failed: {error}")
+
+def _chunks(records: Iterable[dict], size: int, report: dict, stop_on_error: bool) -> Iterator[List[dict]]:
+    chunk = []
+    error = None
+    try:
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    except Exception as e:
+        _source_failed(report, e)
+        error = e
+    if chunk:
+        yield chunk
+    if error is not None and stop_on_error:
+        raise error
+
+def _ingest_chunk(
+    chunk: List[dict],
+    report: dict,
+    recent: _RecentUrls,
+    session_factory: Callable[[], Session],
+    stop_on_error: bool
+):
+    """Normalize, de-duplicate and upsert one chunk in its own transaction"""
+    report["received"] += len(chunk)
+    rows = []
+    for record in chunk:
+        normalized = normalize_record(record)
+        if normalized is None:
+            report["skipped"] += 1
+        elif not recent.add(canonical_url(normalized["url"])):
+            report["duplicates"] += 1
+        else:
+            rows.append(normalized)
+
+    report["chunks"] += 1
+    if not rows:
+        return
+
+    db = session_factory()
+    try:
+        result = upsert_opportunities(rows, db)
+        report["new"] += result["new"]
+        report["updated"] += result["updated"]
+        report["unchanged"] += result["unchanged"]
+        report["merged"] += result["merged"]
+        report["skipped"] += result["skipped"]
+        report["invalid_deadlines"] += result["invalid_deadlines"]
+    except Exception as e:
+        db.rollback()
+        report["failed_chunks"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append(f"chunk {report['chunks']}: {e}")
+        print(f"❌ Ingest chunk {report['chunks']} failed ({len(rows)} records): {e}")
+        if stop_on_error:
+            raise
+    finally:
+        db.close()
+
+def ingest_stream(
+    records: Iterable[dict],
+    chunk_size: int = INGEST_CHUNK_SIZE,
+    session_factory: Callable[[], Session] = SessionLocal,
+    stop_on_error: bool = False
+) -> dict:
+    """
+    Store records from any iterable chunk by chunk (committing each chunk)
+    Returns: report with received/new/updated/unchanged/skipped/duplicates counts
+    """
+    report = _new_report()
+    recent = _RecentUrls()
+    for chunk in _chunks(records, chunk_size, report, stop_on_error):
+        _ingest_chunk(chunk, report, recent, session_factory, stop_on_error)
+    print(
+        f"✅ Ingested {report['received']} records: {report['new']} new, "
+        f"{report['updated']} updated, {report['unchanged']} unchanged"
+    )
+    return report
+
+async def ingest_stream_async(
+    records: Union[AsyncIterable[dict], Iterable[dict]],
+    chunk_size: int = INGEST_CHUNK_SIZE,
+    queue_chunks: int = INGEST_QUEUE_CHUNKS,
+    session_factory: Callable[[], Session] = SessionLocal,
+    stop_on_error: bool = False
+) -> dict:
+    """
+    Async variant of ingest_stream: the producer fills a bounded queue of chunks
+    and waits whenever the database writer falls behind (backpressure).
+    Database work runs in a worker thread so the event loop stays responsive.
+    """
+    report = _new_report()
+    recent = _RecentUrls()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(queue_chunks, 1))
+
+    async def produce():
+        chunk = []
+        error = None
+        try:
+            if hasattr(records, "__aiter__"):
+                async for record in records:
+                    chunk.append(record)
+                    if len(chunk) >= chunk_size:
+                        await queue.put(chunk)
+                        chunk = []
+            else:
+                for record in records:
+                    chunk.append(record)
+                    if len(chunk) >= chunk_size:
+                        await queue.put(chunk)
+                        chunk = []
+        except Exception as e:
+            _source_failed(report, e)
+            error = e
+        if chunk:
+            await queue.put(chunk)
+        await queue.put(None)
+        if error is not None and stop_on_error:
+            raise error
+
+    async def write():
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                return
+            await asyncio.to_thread(_ingest_chunk, chunk, report, recent, session_factory, stop_on_error)
+
+    producer = asyncio.create_task(produce())
+    writer = asyncio.create_task(write())
+    try:
+        # Stop as soon as either side fails (stop_on_error) or the writer is done
+        done, _ = await asyncio.wait({producer, writer}, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+        await writer
+    finally:
+        for task in (producer, writer):
+            if not task.done():
+                task.cancel()
+
+    print(
+        f"✅ Ingested {report['received']} records: {report['new']} new, "
+        f"{report['updated']} updated, {report['unchanged']} unchanged"
+    )
+    return report
@@ -0,0 +1,43 @@
+# Content negotiation between JSON and MessagePack for listing responses
+#
+# Clients that send "Accept: application/msgpack" (or application/x-msgpack)
+# with a higher q than JSON get MessagePack; everyone else gets JSON. Dates
+# are ISO 8601 strings in both formats. msgpack is optional; without it every
+# request is answered with JSON.
+
+from datetime import date
+from typing import Optional
+
+from services.fast_json import dumps
+from services.http_cache import parse_qvalues
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+_MSGPACK_ALIASES = (MSGPACK, "application/x-msgpack")
+
+def negotiate(accept: Optional[str]) -> str:
+    """Response media type for an Accept header (JSON unless MessagePack is preferred)"""
+    if msgpack is None or not accept:
+        return JSON
+    qvalues = parse_qvalues(accept)
+    wildcard = max(qvalues.get("*/*", 0.0), qvalues.get("application/*", 0.0))
+    json_q = qvalues.get(JSON, wildcard)
+    msgpack_q = max((qvalues[alias] for alias in _MSGPACK_ALIASES if alias in qvalues), default=wildcard)
+    return MSGPACK if msgpack_q > json_q else JSON
+
+def _msgpack_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} cannot be packed")
+
+def encode(payload, media_type: str) -> bytes:
+    """payload serialized as media_type"""
+    if media_type == MSGPACK:
+        return msgpack.packb(payload, default=_msgpack_default)
+    return dumps(payload)
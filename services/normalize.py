@@ -0,0 +1,145 @@
+# Deadline normalization for scraped opportunities
+#
+# Scraped deadlines arrive as strings in a handful of formats per source.
+# Precompiled fast paths handle ISO and the common formats; the format that
+# worked last is tried first for each source, and dateutil's heuristic parser
+# is only used when no fast path matches. Results agree with
+# dateutil.parser.parse(value).date() for every format handled here.
+
+import re
+import threading
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from dateutil import parser as dateutil_parser
+
+MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"),
+        ("may",), ("june", "jun"), ("july", "jul"), ("august", "aug"),
+        ("september", "sep", "sept"), ("october", "oct"), ("november", "nov"), ("december", "dec"),
+    ], start=1)
+    for name in names
+}
+
+def _numeric_date(first: str, second: str, year: str) -> date:
+    # Month first like dateutil, unless the first number cannot be a month
+    first, second = int(first), int(second)
+    if first > 12:
+        return date(int(year), second, first)
+    return date(int(year), first, second)
+
+def _month(name: str) -> int:
+    return MONTHS[name.lower()]
+
+# (format name, pattern, builder) tried in this order when a source has no memo
+FAST_FORMATS: List[Tuple[str, "re.Pattern", Callable[..., date]]] = [
+    ("iso_date", re.compile(r"(\d{4})-(\d{2})-(\d{2})"),
+     lambda y, m, d: date(int(y), int(m), int(d))),
+    ("iso_datetime", re.compile(r"(\d{4})-(\d{2})-(\d{2})[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?"),
+     lambda y, m, d: date(int(y), int(m), int(d))),
+    ("month_day_year", re.compile(r"([A-Za-z]{3,9})\.? (\d{1,2})(?:st|nd|rd|th)?,? (\d{4})"),
+     lambda mon, d, y: date(int(y), _month(mon), int(d))),
+    ("day_month_year", re.compile(r"(\d{1,2})(?:st|nd|rd|th)? ([A-Za-z]{3,9})\.?,? (\d{4})"),
+     lambda d, mon, y: date(int(y), _month(mon), int(d))),
+    ("slash_date", re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})"), _numeric_date),
+    ("dotted_date", re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4})"), _numeric_date),
+]
+
+_FORMATS_BY_NAME = {name: (pattern, builder) for name, pattern, builder in FAST_FORMATS}
+
+# Format name recorded for values only dateutil could parse
+HEURISTIC = "heuristic"
+
+def source_of(url: Optional[str]) -> Optional[str]:
+    """Source key (host) used to memoize the deadline format of a scraped URL"""
+    if not url:
+        return None
+    return urlsplit(url).netloc.lower() or None
+
+class DeadlineParser:
+    """Deadline string -> date with per-source format memoization"""
+
+    def __init__(self):
+        self._source_formats: Dict[Optional[str], str] = {}
+        self._lock = threading.Lock()
+        self.stats = {"fast": 0, "heuristic": 0, "failed": 0}
+
+    def _try_format(self, name: str, value: str) -> Optional[date]:
+        pattern, builder = _FORMATS_BY_NAME[name]
+        match = pattern.fullmatch(value)
+        if match is None:
+            return None
+        try:
+            return builder(*match.groups())
+        except (KeyError, ValueError):
+            return None  # e.g. "Foo 12, 2024" or February 30th
+
+    def parse(self, value, source: Optional[str] = None) -> Optional[date]:
+        """
+        Parse a deadline value; dates pass through, datetimes are truncated,
+        unparseable strings give None
+        """
+        if value is None or isinstance(value, date) and not isinstance(value, datetime):
+            return value
+        if isinstance(value, datetime):
+            return value.date()
+        if not isinstance(value, str):
+            return None
+
+        value = value.strip()
+        if not value:
+            return None
+
+        remembered = self._source_formats.get(source)
+        if remembered and remembered != HEURISTIC:
+            parsed = self._try_format(remembered, value)
+            if parsed is not None:
+                self.stats["fast"] += 1
+                return parsed
+
+        for name, _, _ in FAST_FORMATS:
+            if name == remembered:
+                continue
+            parsed = self._try_format(name, value)
+            if parsed is not None:
+                self._remember(source, name)
+                self.stats["fast"] += 1
+                return parsed
+
+        parsed = _heuristic_parse(value)
+        if parsed is None:
+            self.stats["failed"] += 1
+        else:
+            self._remember(source, HEURISTIC)
+            self.stats["heuristic"] += 1
+        return parsed
+
+    def parse_many(self, values: Iterable, source: Optional[str] = None) -> List[Optional[date]]:
+        """Parse a batch of deadlines from one source"""
+        return [self.parse(value, source) for value in values]
+
+    def _remember(self, source: Optional[str], name: str):
+        if self._source_formats.get(source) != name:
+            with self._lock:
+                self._source_formats[source] = name
+
+def _heuristic_parse(value: str) -> Optional[date]:
+    """dateutil fallback for formats without a fast path"""
+    try:
+        return dateutil_parser.parse(value).date()
+    except (ValueError, OverflowError, TypeError):
+        return None
+
+# Process-wide parser used by ingestion
+deadline_parser = DeadlineParser()
+
+def parse_deadline(value, source: Optional[str] = None) -> Optional[date]:
+    """Parse one deadline with the shared parser"""
+    return deadline_parser.parse(value, source)
+
+def parse_deadlines(values: Iterable, source: Optional[str] = None) -> List[Optional[date]]:
+    """Parse a batch of deadlines with the shared parser"""
+    return deadline_parser.parse_many(values, source)
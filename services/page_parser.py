@@ -0,0 +1,119 @@
+# CPU stage of the scraper: parsing fetched pages into opportunity records
+#
+# Runs in the worker processes of a ProcessPoolExecutor (see
+# services/scraper_engine.py), so parsing uses every core and does not hold
+# the GIL of the API process. Kept free of database and HTTP imports, and
+# everything passed in or returned is plain data: a worker needs nothing but
+# this module.
+#
+# Spawned workers also import the top level of the parent's __main__ script
+# once at start-up (as __mp_main__, so `if __name__ == "__main__"` blocks do
+# not run). Under `python main_with_db.py` that builds the app object in each
+# worker, but runs none of its startup hooks: no connections, threads or
+# scheduler. `uvicorn main_with_db:app` skips even that. Scripts that scrape
+# directly must keep their work under an `if __name__ == "__main__"` guard.
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import List, Optional
+from urllib.parse import urljoin
+
+# Parser processes; 0 parses in the scraping thread instead
+SCRAPER_PARSE_WORKERS = int(os.environ.get("SCRAPER_PARSE_WORKERS", str(os.cpu_count() or 1)))
+
+# Niceness added to parser processes, so request handling on the node keeps priority
+SCRAPER_PARSE_NICE = int(os.environ.get("SCRAPER_PARSE_NICE", "10"))
+
+class ScrapeError(Exception):
+    """A page could not be fetched or parsed"""
+
+def _json_path(value, path: Optional[str]):
+    for key in path.split(".") if path else []:
+        if isinstance(value, list) and key.isdigit():
+            value = value[int(key)] if int(key) < len(value) else None
+        elif isinstance(value, dict):
+            value = value.get(key)
+        else:
+            return None
+    return value
+
+def _parse_json(spec: dict, body: bytes) -> List[dict]:
+    items = _json_path(json.loads(body), spec["items"])
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list):
+        raise ScrapeError(f"no item list at '{spec['items']}'")
+    return [
+        {field: _json_path(item, path) for field, path in spec["fields"].items()}
+        for item in items if isinstance(item, dict)
+    ]
+
+def _parse_html(spec: dict, body: bytes) -> List[dict]:
+    try:
+        from bs4 import BeautifulSoup
+    except ImportError:
+        raise ScrapeError("html sources need beautifulsoup4")
+
+    records = []
+    for item in BeautifulSoup(body, "html.parser").select(spec["items"]):
+        record = {}
+        for field, selector_spec in spec["fields"].items():
+            # "selector" for text, "selector@attr" for an attribute; "@attr" on the item itself
+            selector, _, attribute = selector_spec.partition("@")
+            element = item.select_one(selector) if selector else item
+            if element is None:
+                record[field] = None
+            elif attribute:
+                record[field] = element.get(attribute)
+            else:
+                record[field] = element.get_text(" ", strip=True)
+        records.append(record)
+    return records
+
+def matches(record: dict, filters: dict) -> bool:
+    """Whether a record passes the keyword/region/type filters its source URL could not apply"""
+    for name, value in filters.items():
+        value = value.lower()
+        if name == "keyword":
+            text = " ".join(str(record.get(field) or "") for field in ("title", "description", "tags")).lower()
+            if not all(term in text for term in value.split()):
+                return False
+        elif name == "region" and value not in str(record.get("location") or "").lower():
+            return False
+        elif name == "type" and value != str(record.get("type") or "").lower():
+            return False
+    return True
+
+def parse_page(spec: dict, body: bytes, page_url: str, filters: Optional[dict] = None) -> List[dict]:
+    """
+    Opportunity records of one fetched page (spec from ScraperSource.parse_spec()),
+    URLs made absolute, only those matching filters
+    """
+    parser = _parse_json if spec["format"] == "json" else _parse_html
+    records = []
+    for record in parser(spec, body):
+        record = {**spec["defaults"], **{key: value for key, value in record.items() if value is not None}}
+        if isinstance(record.get("tags"), list):
+            record["tags"] = ",".join(str(tag) for tag in record["tags"])
+        if record.get("url"):
+            record["url"] = urljoin(page_url, str(record["url"]))
+        if not filters or matches(record, filters):
+            records.append(record)
+    return records
+
+def _lower_priority():
+    try:
+        os.nice(SCRAPER_PARSE_NICE)
+    except (AttributeError, OSError):
+        pass
+
+def make_parse_pool(workers: int = SCRAPER_PARSE_WORKERS) -> Optional[ProcessPoolExecutor]:
+    """
+    Process pool for parse_page, None when workers is 0. Workers are spawned
+    rather than forked: the API process has threads and open connections
+    """
+    if workers <= 0:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"), initializer=_lower_priority)
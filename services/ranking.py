@@ -0,0 +1,177 @@
+# BM25 relevance ranking for opportunity search
+#
+# Term frequencies (opportunity_terms) and field lengths (opportunity_doc_stats)
+# are computed once when an opportunity is stored, so ranking a query only reads
+# the posting rows of the query terms and never re-tokenizes documents.
+
+import math
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, func, literal
+from sqlalchemy.orm import Session
+
+from database_setup import Opportunity, OpportunityTerm, OpportunityDocStats
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# BM25F parameters: per-field boost and length normalisation
+K1 = 1.2
+FIELD_BOOSTS = {"title": 3.0, "tags": 2.0, "description": 1.0}
+FIELD_B = {"title": 0.75, "tags": 0.5, "description": 0.75}
+
+# Corpus statistics (document count, average field lengths) are cached this long
+CORPUS_STATS_TTL_SECONDS = 60
+
+_corpus_stats: Optional[dict] = None
+_corpus_stats_at = 0.0
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """Lowercased word tokens"""
+    return TOKEN_PATTERN.findall(value.lower()) if value else []
+
+def index_opportunities(db: Session, opportunities: list):
+    """
+    (Re)compute term frequencies and field lengths for the given opportunities
+    (models or rows with id, title, tags and description)
+    Runs inside the caller's transaction; the caller commits
+    """
+    # The same row can be touched more than once in a batch
+    opportunities = list({opp.id: opp for opp in opportunities}.values())
+    ids = [opp.id for opp in opportunities]
+    if not ids:
+        return
+
+    db.query(OpportunityTerm).filter(OpportunityTerm.opportunity_id.in_(ids)).delete(synchronize_session=False)
+    db.query(OpportunityDocStats).filter(OpportunityDocStats.opportunity_id.in_(ids)).delete(synchronize_session=False)
+
+    term_rows = []
+    stats_rows = []
+    for opp in opportunities:
+        fields = {
+            "title": tokenize(opp.title),
+            "tags": tokenize(opp.tags),
+            "description": tokenize(opp.description),
+        }
+        counts = {field: Counter(tokens) for field, tokens in fields.items()}
+        for term in set().union(*counts.values()):
+            term_rows.append({
+                "opportunity_id": opp.id,
+                "term": term,
+                "title_tf": counts["title"][term],
+                "tags_tf": counts["tags"][term],
+                "description_tf": counts["description"][term],
+            })
+        stats_rows.append({
+            "opportunity_id": opp.id,
+            "title_len": len(fields["title"]),
+            "tags_len": len(fields["tags"]),
+            "description_len": len(fields["description"]),
+        })
+
+    if term_rows:
+        db.execute(OpportunityTerm.__table__.insert(), term_rows)
+    db.execute(OpportunityDocStats.__table__.insert(), stats_rows)
+    invalidate_corpus_stats()
+
+def ensure_term_index(db: Session, batch_size: int = 500) -> int:
+    """
+    Index opportunities that have no statistics yet (e.g. rows stored before
+    ranking existed). Returns the number of opportunities indexed
+    """
+    indexed = 0
+    while True:
+        batch = db.query(Opportunity).filter(
+            ~Opportunity.id.in_(db.query(OpportunityDocStats.opportunity_id))
+        ).limit(batch_size).all()
+        if not batch:
+            break
+        index_opportunities(db, batch)
+        db.commit()
+        indexed += len(batch)
+    if indexed:
+        print(f"✅ Indexed {indexed} opportunities for relevance ranking")
+    return indexed
+
+def invalidate_corpus_stats():
+    global _corpus_stats
+    _corpus_stats = None
+
+def get_corpus_stats(db: Session) -> dict:
+    """Document count and average field lengths (cached)"""
+    global _corpus_stats, _corpus_stats_at
+
+    if _corpus_stats is not None and time.monotonic() - _corpus_stats_at < CORPUS_STATS_TTL_SECONDS:
+        return _corpus_stats
+
+    count, title_avg, tags_avg, description_avg = db.query(
+        func.count(OpportunityDocStats.opportunity_id),
+        func.avg(OpportunityDocStats.title_len),
+        func.avg(OpportunityDocStats.tags_len),
+        func.avg(OpportunityDocStats.description_len),
+    ).one()
+    _corpus_stats = {
+        "count": count or 0,
+        # Guard against division by zero for empty fields
+        "avg_len": {
+            "title": float(title_avg or 0) or 1.0,
+            "tags": float(tags_avg or 0) or 1.0,
+            "description": float(description_avg or 0) or 1.0,
+        },
+    }
+    _corpus_stats_at = time.monotonic()
+    return _corpus_stats
+
+def _idf(db: Session, terms: List[str], doc_count: int) -> Dict[str, float]:
+    """BM25 inverse document frequency of each query term"""
+    document_frequency = dict(
+        db.query(OpportunityTerm.term, func.count())
+        .filter(OpportunityTerm.term.in_(terms))
+        .group_by(OpportunityTerm.term)
+        .all()
+    )
+    return {
+        term: math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+        for term, df in document_frequency.items()
+    }
+
+def bm25_scores(db: Session, keyword: str):
+    """
+    Subquery of (opportunity_id, score) for opportunities containing every
+    term of keyword, or None when some term matches nothing
+    """
+    terms = sorted(set(tokenize(keyword)))
+    if not terms:
+        return None
+
+    stats = get_corpus_stats(db)
+    idf = _idf(db, terms, stats["count"])
+    if len(idf) < len(terms):
+        return None  # AND semantics: a term with no postings matches no document
+
+    columns = {
+        "title": (OpportunityTerm.title_tf, OpportunityDocStats.title_len),
+        "tags": (OpportunityTerm.tags_tf, OpportunityDocStats.tags_len),
+        "description": (OpportunityTerm.description_tf, OpportunityDocStats.description_len),
+    }
+    weighted_tf = sum(
+        FIELD_BOOSTS[field] * tf
+        / (1 - FIELD_B[field] + FIELD_B[field] * length / stats["avg_len"][field])
+        for field, (tf, length) in columns.items()
+    )
+    term_idf = case(idf, value=OpportunityTerm.term, else_=literal(0.0))
+    term_score = term_idf * weighted_tf * (K1 + 1) / (weighted_tf + K1)
+
+    return (
+        db.query(
+            OpportunityTerm.opportunity_id.label("opportunity_id"),
+            func.sum(term_score).label("score"),
+        )
+        .join(OpportunityDocStats, OpportunityDocStats.opportunity_id == OpportunityTerm.opportunity_id)
+        .filter(OpportunityTerm.term.in_(terms))
+        .group_by(OpportunityTerm.opportunity_id)
+        .having(func.count() == len(terms))
+        .subquery()
+    )
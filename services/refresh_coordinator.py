@@ -0,0 +1,179 @@
+# Single-flight coordination of background refreshes
+#
+# A stale dataset used to start one scrape per /search request, in every
+# worker. Now a refresh of a scope runs at most once at a time:
+#
+# - in process, claim(scope) lets only the first caller schedule the job;
+#   everyone else keeps serving the data already stored
+# - across workers, the job first takes a lease row in refresh_leases
+#   (INSERT ... ON CONFLICT DO UPDATE WHERE the old lease expired). Unlike a
+#   session-level advisory lock this also works behind pgbouncer in
+#   transaction mode; a worker that dies simply lets its lease expire
+# - with the lease held, freshness is re-read from the database, so a worker
+#   that waited for another one's refresh does not scrape again
+#
+# Every lease and freshness query runs in its own short session: no
+# connection (or pgbouncer server connection) is held while the job scrapes.
+
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from database_setup import RefreshLease, SessionLocal
+from services.db_service import needs_refresh
+
+# Longest a refresh may hold its scope; set above the slowest scrape
+REFRESH_LEASE_SECONDS = int(os.environ.get("REFRESH_LEASE_SECONDS", "900"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Outcomes of RefreshCoordinator.run
+DONE = "done"
+BUSY = "busy"        # another worker holds the lease
+FRESH = "fresh"      # refreshed by someone else in the meantime
+FAILED = "failed"
+
+def _insert(dialect: str):
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+class RefreshCoordinator:
+    """One in-flight refresh per scope, in this process and across workers"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        lease_seconds: int = REFRESH_LEASE_SECONDS,
+        worker_id: str = WORKER_ID
+    ):
+        self.session_factory = session_factory
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self.stats = {"claimed": 0, "collapsed": 0, DONE: 0, BUSY: 0, FRESH: 0, FAILED: 0}
+
+    def claim(self, scope: str) -> bool:
+        """Reserve scope in this process; False if a refresh of it is already scheduled or running"""
+        with self._lock:
+            if scope in self._in_flight:
+                self.stats["collapsed"] += 1
+                return False
+            self._in_flight.add(scope)
+            self.stats["claimed"] += 1
+            return True
+
+    def release(self, scope: str):
+        with self._lock:
+            self._in_flight.discard(scope)
+
+    def in_flight(self) -> list:
+        with self._lock:
+            return sorted(self._in_flight)
+
+    def _acquire_lease(self, scope: str, token: str) -> bool:
+        table = RefreshLease.__table__
+        now = datetime.now(timezone.utc)
+        db = self.session_factory()
+        try:
+            stmt = _insert(db.get_bind().dialect.name)(table).values(
+                scope=scope,
+                owner=token,
+                acquired_at=now,
+                expires_at=now + timedelta(seconds=self.lease_seconds)
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.scope],
+                set_={
+                    "owner": stmt.excluded.owner,
+                    "acquired_at": stmt.excluded.acquired_at,
+                    "expires_at": stmt.excluded.expires_at,
+                },
+                # Only take over a lease its holder let expire
+                where=table.c.expires_at < now
+            )
+            row = db.execute(stmt.returning(table.c.owner)).first()
+            db.commit()
+            return row is not None and row.owner == token
+        finally:
+            db.close()
+
+    def _release_lease(self, scope: str, token: str):
+        db = self.session_factory()
+        try:
+            db.query(RefreshLease).filter(
+                RefreshLease.scope == scope, RefreshLease.owner == token
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _is_fresh(self, scope: str, max_age_hours: float) -> bool:
+        db = self.session_factory()
+        try:
+            return not needs_refresh(db, max_age_hours=max_age_hours, scope=scope, use_cache=False)
+        finally:
+            db.close()
+
+    def run(
+        self,
+        scope: str,
+        job: Callable,
+        *args,
+        max_age_hours: Optional[float] = None
+    ) -> Tuple[str, object]:
+        """
+        Run job(*args) for a scope claimed with claim(), holding the scope's
+        lease; skipped when another worker holds it or, with max_age_hours,
+        when the scope turned out to be fresh. Always releases the claim.
+        Returns: (outcome, job result, or the exception when it failed)
+        """
+        token = f"{self.worker_id}:{uuid.uuid4().hex[:8]}"
+        outcome, result = FAILED, None
+        try:
+            if not self._acquire_lease(scope, token):
+                outcome = BUSY
+                return outcome, None
+            try:
+                if max_age_hours is not None and self._is_fresh(scope, max_age_hours):
+                    outcome = FRESH
+                    return outcome, None
+                result = job(*args)
+                outcome = DONE
+                return outcome, result
+            finally:
+                self._release_lease(scope, token)
+        except Exception as e:
+            print(f"❌ Refresh of '{scope}' failed: {e}")
+            return outcome, e
+        finally:
+            with self._lock:
+                self._in_flight.discard(scope)
+                self.stats[outcome] += 1
+
+    def leases(self) -> list:
+        """Leases currently held by any worker"""
+        db = self.session_factory()
+        try:
+            return [
+                {
+                    "scope": lease.scope,
+                    "owner": lease.owner,
+                    "acquired_at": lease.acquired_at.isoformat(),
+                    "expires_at": lease.expires_at.isoformat(),
+                }
+                for lease in db.query(RefreshLease).order_by(RefreshLease.acquired_at)
+            ]
+        finally:
+            db.close()
+
+# Process-wide coordinator used by main_with_db.py
+refresh_coordinator = RefreshCoordinator()
@@ -0,0 +1,194 @@
+# Read-replica routing for read-only endpoints
+#
+# DATABASE_READ_URLS is a comma-separated list of replica URLs. Read-only
+# endpoints take a replica session (round-robin over the healthy replicas);
+# writes always use the primary. A background thread checks every replica's
+# health and replication lag; replicas that are down or lag more than
+# DATABASE_READ_MAX_LAG_SECONDS are skipped, and reads go to the primary when
+# none is usable. After a write in this process, reads stay on the primary
+# for DATABASE_READ_PIN_SECONDS so a refresh is immediately visible.
+
+import itertools
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+DATABASE_READ_MAX_LAG_SECONDS = float(os.environ.get("DATABASE_READ_MAX_LAG_SECONDS", "10"))
+DATABASE_READ_CHECK_INTERVAL_SECONDS = float(os.environ.get("DATABASE_READ_CHECK_INTERVAL_SECONDS", "5"))
+DATABASE_READ_PIN_SECONDS = float(
+    os.environ.get("DATABASE_READ_PIN_SECONDS", str(DATABASE_READ_MAX_LAG_SECONDS))
+)
+
+# Seconds behind the primary; 0 when the replica has replayed everything it received
+POSTGRES_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+def read_urls_from_env() -> List[str]:
+    """Replica URLs from DATABASE_READ_URLS"""
+    return [url.strip() for url in os.environ.get("DATABASE_READ_URLS", "").split(",") if url.strip()]
+
+class Replica:
+    """One read replica: its engines, session factories and last health check"""
+
+    def __init__(self, name: str, engine, async_engine=None):
+        self.name = name
+        self.engine = engine
+        self.async_engine = async_engine
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.async_session_factory = None
+        if async_engine is not None:
+            from sqlalchemy.ext.asyncio import async_sessionmaker
+
+            self.async_session_factory = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+        # Assumed usable until the first check says otherwise
+        self.healthy = True
+        self.lag_seconds: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def check(self):
+        """Probe the replica and record whether it is up and how far it lags"""
+        try:
+            with self.engine.connect() as conn:
+                if self.engine.dialect.name == "postgresql":
+                    lag = float(conn.execute(POSTGRES_LAG_SQL).scalar() or 0)
+                else:
+                    conn.execute(text("SELECT 1"))
+                    lag = 0.0
+            self.healthy = True
+            self.lag_seconds = lag
+            self.last_error = None
+        except Exception as e:
+            self.mark_down(e)
+        self.checked_at = time.monotonic()
+
+    def mark_down(self, error: Exception):
+        self.healthy = False
+        self.failures += 1
+        self.last_error = str(error).splitlines()[0] if str(error) else type(error).__name__
+
+    def usable(self, max_lag_seconds: float) -> bool:
+        return self.healthy and (self.lag_seconds is None or self.lag_seconds <= max_lag_seconds)
+
+class ReplicaRouter:
+    """Round-robin selection over healthy, caught-up replicas"""
+
+    def __init__(
+        self,
+        replicas: List[Replica],
+        max_lag_seconds: float = DATABASE_READ_MAX_LAG_SECONDS,
+        check_interval: float = DATABASE_READ_CHECK_INTERVAL_SECONDS,
+        pin_seconds: float = DATABASE_READ_PIN_SECONDS
+    ):
+        self.replicas = replicas
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self.pin_seconds = pin_seconds
+        self._next = itertools.count()
+        self._last_write = float("-inf")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.replica_reads = 0
+        self.primary_reads = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def note_write(self, *_):
+        """Pin reads to the primary for a while (usable as an ingest listener)"""
+        self._last_write = time.monotonic()
+
+    def pinned(self) -> bool:
+        return time.monotonic() - self._last_write < self.pin_seconds
+
+    def pick(self) -> Optional[Replica]:
+        """Replica to read from, or None to read from the primary"""
+        if self.replicas and not self.pinned():
+            usable = [replica for replica in self.replicas if replica.usable(self.max_lag_seconds)]
+            if usable:
+                self.replica_reads += 1
+                return usable[next(self._next) % len(usable)]
+        self.primary_reads += 1
+        return None
+
+    def check_all(self):
+        for replica in self.replicas:
+            replica.check()
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            self.check_all()
+
+    def start(self):
+        """Check every replica now, then keep checking in a background thread"""
+        if not self.replicas or self._thread is not None:
+            return
+        self.check_all()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replica-health", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.check_interval)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "replicas": [
+                {
+                    "name": replica.name,
+                    "healthy": replica.healthy,
+                    "usable": replica.usable(self.max_lag_seconds),
+                    "lag_seconds": replica.lag_seconds,
+                    "failures": replica.failures,
+                    "last_error": replica.last_error,
+                }
+                for replica in self.replicas
+            ],
+            "max_lag_seconds": self.max_lag_seconds,
+            "pinned_to_primary": self.pinned(),
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+        }
+
+class ReplicaSession:
+    """
+    Async read session on a replica; if the replica fails mid-request the
+    replica is marked down and the read is retried on the primary
+    """
+
+    def __init__(self, session, replica: Replica, primary_factory: Callable):
+        self.session = session
+        self.replica = replica
+        self._primary_factory = primary_factory
+
+    async def run_sync(self, fn, *args, **kwargs):
+        try:
+            return await self.session.run_sync(fn, *args, **kwargs)
+        except OperationalError as e:
+            # Connection refused, server shut down, ...
+            self.replica.mark_down(e)
+            print(f"⚠️ Read replica {self.replica.name} failed, retrying on primary: {self.replica.last_error}")
+            primary = self._primary_factory()
+            try:
+                return await primary.run_sync(fn, *args, **kwargs)
+            finally:
+                await primary.close()
+
+    async def close(self):
+        await self.session.close()
@@ -1,10 +1,49 @@
-# Placeholder scraper - replace with your actual scraper implementation
+# Scraper entry points used by the API, the scheduler and the ingest jobs
+# (the engine and its configuration are in services/scraper_engine.py)
 
-def scrape_opportunities(keyword=None, region=None, type_filter=None):
+from typing import List, Optional
+
+from services.fetch_cache import FetchCache, SCRAPER_FETCH_CACHE
+from services.scraper_engine import ScrapeStream, ScraperEngine
+
+# Sources are read from SCRAPER_SOURCES / SCRAPER_SOURCES_FILE once per process
+scraper_engine = ScraperEngine(fetch_cache=FetchCache() if SCRAPER_FETCH_CACHE else None)
+
+def scrape_opportunities(
+    keyword: Optional[str] = None,
+    region: Optional[str] = None,
+    type_filter: Optional[str] = None,
+    use_cache: bool = True
+) -> List[dict]:
+    """
+    Scrape every configured source for opportunities matching the filters
+    Pages unchanged since the last commit_scraped() are skipped unless use_cache=False
+    Blocking; call from a worker thread, not from the event loop
+    """
+    return scraper_engine.scrape_sync(keyword, region, type_filter, use_cache)
+
+async def scrape_opportunities_async(
+    keyword: Optional[str] = None,
+    region: Optional[str] = None,
+    type_filter: Optional[str] = None,
+    use_cache: bool = True
+) -> List[dict]:
+    """Async scrape_opportunities, for code already running on an event loop"""
+    return await scraper_engine.scrape(keyword, region, type_filter, use_cache)
+
+def stream_opportunities(
+    keyword: Optional[str] = None,
+    region: Optional[str] = None,
+    type_filter: Optional[str] = None,
+    use_cache: bool = True
+) -> ScrapeStream:
     """
-    Placeholder for opportunity scraper
-    Replace this with your actual scraping logic
+    scrape_opportunities as an async iterator yielding records page by page
+    as they are parsed, for ingest_stream_async; pass it to commit_scraped
+    once it is stored
     """
-    print(f"⚠️ Scraper called but not implemented. Keyword: {keyword}")
-    return []
+    return scraper_engine.stream(keyword, region, type_filter, use_cache)
 
+def commit_scraped(opportunities: List[dict]):
+    """Call once scraped opportunities are stored: their pages count as unchanged until they change"""
+    scraper_engine.commit(opportunities)
@@ -0,0 +1,288 @@
+# Periodic refresh scheduler
+#
+# Scraping runs on a timer instead of on the request path. Every configured
+# source (a keyword/region/type scope of the scraper) has its own interval;
+# each run is pushed back or forward by up to REFRESH_JITTER of it so workers
+# and sources don't fire in lockstep. A source whose runs find nothing new or
+# changed is checked less often (the interval grows by REFRESH_BACKOFF_FACTOR
+# per quiet or failed run, up to REFRESH_MAX_BACKOFF times), and goes back to
+# its base interval as soon as a run finds new or changed opportunities.
+#
+# Runs go through refresh_coordinator, so with several API workers each
+# running a scheduler a source is still scraped once: the other workers find
+# the lease taken or the scope already fresh.
+#
+# REFRESH_SCHEDULER selects where it runs:
+#   app       in a background thread of the API process (default)
+#   external  in a separate process: python -m services.scheduler
+#   off       not at all; /search refreshes stale scopes on demand as before
+#
+# REFRESH_SOURCES is a JSON list of sources, e.g.
+#   [{"name": "all", "interval_minutes": 360},
+#    {"name": "scholarships", "keyword": "scholarship", "interval_minutes": 120}]
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from database_setup import SessionLocal
+from services.db_service import get_last_refresh, record_refresh, refresh_scope
+from services.ingest import ingest_stream_async
+from services.refresh_coordinator import DONE, BUSY, FAILED, RefreshCoordinator, refresh_coordinator
+from services.run_scraper import stream_opportunities, commit_scraped
+
+SCHEDULER_MODES = ("app", "external", "off")
+REFRESH_SCHEDULER = os.environ.get("REFRESH_SCHEDULER", "app").strip().lower()
+if REFRESH_SCHEDULER not in SCHEDULER_MODES:
+    raise ValueError(f"REFRESH_SCHEDULER must be one of {', '.join(SCHEDULER_MODES)}")
+
+# Whether stale data is refreshed by the scheduler rather than by /search
+SCHEDULED_REFRESH = REFRESH_SCHEDULER != "off"
+
+DEFAULT_SOURCES = [{"name": "all", "interval_minutes": 360}]
+REFRESH_JITTER = float(os.environ.get("REFRESH_JITTER", "0.1"))
+REFRESH_BACKOFF_FACTOR = float(os.environ.get("REFRESH_BACKOFF_FACTOR", "2"))
+REFRESH_MAX_BACKOFF = float(os.environ.get("REFRESH_MAX_BACKOFF", "8"))
+
+# Spread of the first runs after start-up, so restarted workers don't scrape together
+REFRESH_STARTUP_SPREAD_SECONDS = float(os.environ.get("REFRESH_STARTUP_SPREAD_SECONDS", "30"))
+
+def _timestamp(value: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(value, timezone.utc).isoformat() if value else None
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+class RefreshSource:
+    """One scheduled scrape and its run history"""
+
+    def __init__(
+        self,
+        name: str,
+        interval_minutes: float,
+        keyword: Optional[str] = None,
+        region: Optional[str] = None,
+        type: Optional[str] = None
+    ):
+        if interval_minutes <= 0:
+            raise ValueError(f"Refresh source '{name}': interval_minutes must be positive")
+        self.name = name
+        self.interval = interval_minutes * 60
+        self.keyword = keyword
+        self.region = region
+        self.type = type
+        self.scope = refresh_scope(keyword, region, type)
+        self.backoff = 1.0
+        self.next_run: Optional[float] = None
+        self.last_run: Optional[float] = None
+        self.last_outcome: Optional[str] = None
+        self.last_duration: Optional[float] = None
+        self.last_report: Optional[dict] = None
+        self.last_error: Optional[str] = None
+        self.quiet_runs = 0
+        self.running = False
+
+    @property
+    def current_interval(self) -> float:
+        return self.interval * self.backoff
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "scope": self.scope,
+            "interval_minutes": self.interval / 60,
+            "backoff": self.backoff,
+            "current_interval_minutes": round(self.current_interval / 60, 1),
+            "next_run_at": _timestamp(self.next_run),
+            "last_run_at": _timestamp(self.last_run),
+            "last_outcome": self.last_outcome,
+            "last_duration_seconds": round(self.last_duration, 2) if self.last_duration is not None else None,
+            "last_report": self.last_report,
+            "last_error": self.last_error,
+            "quiet_runs": self.quiet_runs,
+            "running": self.running,
+        }
+
+def load_sources(config: Optional[str] = None) -> List[RefreshSource]:
+    """Sources from REFRESH_SOURCES (JSON list), one global source by default"""
+    config = config if config is not None else os.environ.get("REFRESH_SOURCES", "")
+    entries = json.loads(config) if config.strip() else DEFAULT_SOURCES
+    sources = [RefreshSource(**entry) for entry in entries]
+    names = [source.name for source in sources]
+    if len(set(names)) != len(names):
+        raise ValueError("REFRESH_SOURCES: source names must be unique")
+    return sources
+
+class RefreshScheduler:
+    """Runs every source's refresh when it is due, one at a time, in a background thread"""
+
+    def __init__(
+        self,
+        sources: List[RefreshSource],
+        coordinator: RefreshCoordinator = refresh_coordinator,
+        session_factory: Callable[[], Session] = SessionLocal,
+        scrape: Callable = stream_opportunities,
+        jitter: float = REFRESH_JITTER,
+        backoff_factor: float = REFRESH_BACKOFF_FACTOR,
+        max_backoff: float = REFRESH_MAX_BACKOFF,
+        startup_spread: float = REFRESH_STARTUP_SPREAD_SECONDS
+    ):
+        self.sources: Dict[str, RefreshSource] = {source.name: source for source in sources}
+        self.coordinator = coordinator
+        self.session_factory = session_factory
+        self.scrape = scrape
+        self.jitter = jitter
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.startup_spread = startup_spread
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _jittered(self, seconds: float) -> float:
+        return seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _plan_first_runs(self):
+        # Continue from the last recorded refresh, so a restart doesn't rescrape
+        now = time.time()
+        db = self.session_factory()
+        try:
+            for source in self.sources.values():
+                last = get_last_refresh(db, source.scope, use_cache=False)
+                due = last.timestamp() + source.interval if last else now
+                source.next_run = max(due, now) + random.uniform(0, self.startup_spread)
+        finally:
+            db.close()
+
+    def refresh(self, source: RefreshSource) -> dict:
+        """Scrape one source and store it; recorded as a refresh of its scope when complete"""
+        scraped = self.scrape(source.keyword, source.region, source.type)
+        # Stored chunk by chunk as pages are parsed
+        report = asyncio.run(ingest_stream_async(scraped))
+        if report["errors"]:
+            raise RuntimeError(f"{report['failed_chunks']} chunks failed: {report['errors'][0]}")
+        commit_scraped(scraped)
+        db = self.session_factory()
+        try:
+            record_refresh(db, source.scope, report["received"], report["new"])
+        finally:
+            db.close()
+        return report
+
+    def run_source(self, source: RefreshSource):
+        """Run a source now and schedule its next run"""
+        started = time.time()
+        with self._lock:
+            source.running = True
+        outcome, result = BUSY, None
+        try:
+            if self.coordinator.claim(source.scope):
+                # Skip the scrape if another worker refreshed the scope recently enough
+                max_age_hours = source.current_interval * (1 - self.jitter) / 3600
+                outcome, result = self.coordinator.run(
+                    source.scope, self.refresh, source, max_age_hours=max_age_hours
+                )
+        finally:
+            with self._lock:
+                source.running = False
+                source.last_run = started
+                source.last_duration = time.time() - started
+                source.last_outcome = outcome
+                if outcome == DONE:
+                    source.last_report = {
+                        key: result[key] for key in ("received", "new", "updated", "unchanged", "skipped")
+                    }
+                    source.last_error = None
+                    if result["new"] or result["updated"]:
+                        source.quiet_runs = 0
+                        source.backoff = 1.0
+                    else:
+                        source.quiet_runs += 1
+                        source.backoff = min(source.backoff * self.backoff_factor, self.max_backoff)
+                elif outcome == FAILED:
+                    source.last_error = str(result)
+                    source.backoff = min(source.backoff * self.backoff_factor, self.max_backoff)
+                source.next_run = time.time() + self._jittered(source.current_interval)
+
+        print(f"🕒 Scheduled refresh '{source.name}': {outcome}, next in {source.next_run - time.time():.0f}s")
+
+    def _due(self) -> List[RefreshSource]:
+        now = time.time()
+        return [source for source in self.sources.values() if source.next_run <= now]
+
+    def _run(self):
+        while not self._stop.is_set():
+            for source in self._due():
+                if self._stop.is_set():
+                    return
+                try:
+                    self.run_source(source)
+                except Exception as e:
+                    print(f"❌ Scheduled refresh '{source.name}' error: {e}")
+            next_run = min(source.next_run for source in self.sources.values())
+            self._stop.wait(max(0.0, next_run - time.time()))
+
+    def start(self):
+        """Plan each source's first run, then run them in a background thread"""
+        if not self.sources or self._thread is not None:
+            return
+        self._plan_first_runs()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="refresh-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        # A refresh in progress finishes in its daemon thread; its lease expires if the process exits
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def run_forever(self):
+        """Run in the foreground (separate scheduler process)"""
+        self._plan_first_runs()
+        self._stop.clear()
+        self._run()
+
+    def status(self) -> dict:
+        """
+        Schedule and run history of this process's sources; last_success_at
+        comes from the database, so it also covers runs of other processes
+        """
+        db = self.session_factory()
+        try:
+            last_success = {
+                source.scope: get_last_refresh(db, source.scope) for source in self.sources.values()
+            }
+        finally:
+            db.close()
+        with self._lock:
+            sources = [
+                {**source.status(), "last_success_at": _iso(last_success[source.scope])}
+                for source in self.sources.values()
+            ]
+        return {
+            "mode": REFRESH_SCHEDULER,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "sources": sources,
+        }
+
+# Process-wide scheduler used by main_with_db.py
+refresh_scheduler = RefreshScheduler(load_sources())
+
+if __name__ == "__main__":
+    from database_setup import init_db
+
+    init_db()
+    print(f"🕒 Refresh scheduler: {', '.join(refresh_scheduler.sources)}")
+    try:
+        refresh_scheduler.run_forever()
+    except KeyboardInterrupt:
+        pass
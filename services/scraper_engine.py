@@ -0,0 +1,507 @@
+# Concurrent scraping engine
+#
+# Every configured source is fetched at once on one event loop through a
+# pooled httpx.AsyncClient (keep-alive connections shared by all requests of a
+# run). Load on the sites is bounded three ways: at most SCRAPER_PER_HOST
+# requests in flight per host, SCRAPER_MAX_CONNECTIONS overall, and a global
+# token bucket of SCRAPER_RATE_LIMIT requests per second. Requests time out
+# after SCRAPER_TIMEOUT seconds; timeouts, connection errors, 429 and 5xx are
+# retried up to SCRAPER_RETRIES times with full-jitter exponential backoff
+# (Retry-After is honoured). A source that still fails is reported and
+# skipped; the others' results are kept.
+#
+# Sources come from SCRAPER_SOURCES (JSON list) or the JSON file named by
+# SCRAPER_SOURCES_FILE:
+#
+#   {"name": "grants",
+#    "url": "https://example.org/api/search?q={keyword}&region={region}&page={page}",
+#    "format": "json",            # or "html" (needs beautifulsoup4)
+#    "items": "data.results",     # JSON path to the list / CSS selector per item
+#    "fields": {"title": "name", "url": "link", "organization": "funder.name"},
+#    "defaults": {"type": "grant"},
+#    "pages": 3}
+#
+# Placeholders are URL-encoded; a filter the URL has no placeholder for is
+# applied to the parsed records instead.
+#
+# With a FetchCache, requests are conditional and pages that did not change
+# since they were last stored are skipped before parsing (see
+# services/fetch_cache.py); commit() records the pages once they are stored.
+#
+# Fetching and parsing are separate stages: fetched pages go through a
+# bounded queue (SCRAPER_PARSE_QUEUE pages, fetchers wait when it is full) to
+# parse_page running in a process pool of SCRAPER_PARSE_WORKERS (see
+# services/page_parser.py), so parsing scales with cores and never holds the
+# GIL of the API process.
+#
+# scrape() returns every record at once; stream() yields each page's records
+# as soon as it is parsed (parsers wait while the consumer is behind), for
+# ingest_stream_async to store chunk by chunk while later pages are fetched.
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote_plus, urlsplit
+
+import httpx
+
+from services.fetch_cache import FetchCache, cache_key, content_hash
+from services.page_parser import SCRAPER_PARSE_WORKERS, ScrapeError, make_parse_pool, parse_page
+
+SCRAPER_MAX_CONNECTIONS = int(os.environ.get("SCRAPER_MAX_CONNECTIONS", "20"))
+SCRAPER_PER_HOST = int(os.environ.get("SCRAPER_PER_HOST", "4"))
+SCRAPER_RATE_LIMIT = float(os.environ.get("SCRAPER_RATE_LIMIT", "10"))  # requests per second, all hosts
+SCRAPER_TIMEOUT = float(os.environ.get("SCRAPER_TIMEOUT", "15"))
+SCRAPER_RETRIES = int(os.environ.get("SCRAPER_RETRIES", "3"))
+SCRAPER_BACKOFF_BASE = float(os.environ.get("SCRAPER_BACKOFF_BASE", "0.5"))
+SCRAPER_BACKOFF_MAX = float(os.environ.get("SCRAPER_BACKOFF_MAX", "10"))
+SCRAPER_USER_AGENT = os.environ.get("SCRAPER_USER_AGENT", "AIpplyBot/1.0 (+https://aipply.app)")
+
+# Fetched pages waiting to be parsed (bounds the bodies held in memory)
+SCRAPER_PARSE_QUEUE = int(os.environ.get("SCRAPER_PARSE_QUEUE", "16"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Opportunity fields a source can fill (see database_setup.Opportunity)
+RECORD_FIELDS = ("title", "description", "type", "organization", "location", "deadline", "url", "tags")
+
+class ScrapeResult(list):
+    """Scraped records, plus the fetched pages to record in the fetch cache once they are stored"""
+
+    def __init__(self, records: List[dict] = (), pages: Optional[List[dict]] = None):
+        super().__init__(records)
+        self.pages = pages or []
+
+class ScrapeStream:
+    """
+    Scraped records as an async iterator (one pass), plus the fetched pages,
+    filled in as it runs, to record in the fetch cache once they are stored
+    """
+
+    def __init__(
+        self,
+        engine: "ScraperEngine",
+        keyword: Optional[str] = None,
+        region: Optional[str] = None,
+        type_filter: Optional[str] = None,
+        use_cache: bool = True
+    ):
+        self.engine = engine
+        self.filters = (keyword, region, type_filter, use_cache)
+        self.pages: List[dict] = []
+
+    def __aiter__(self) -> AsyncIterator[dict]:
+        return self.engine._stream(*self.filters, self.pages)
+
+def _unique(records: Iterable[dict], seen: Set[str]) -> Iterator[dict]:
+    """Records with a URL not in seen yet (adding it)"""
+    for record in records:
+        url = record.get("url")
+        if url and url not in seen:
+            seen.add(url)
+            yield record
+
+class ScraperSource:
+    """One site or API and how to read opportunities from its pages"""
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        format: str = "json",
+        items: Optional[str] = None,
+        fields: Optional[Dict[str, str]] = None,
+        defaults: Optional[Dict[str, str]] = None,
+        pages: int = 1
+    ):
+        if format not in ("json", "html"):
+            raise ValueError(f"Scraper source '{name}': format must be json or html")
+        if format == "html" and not items:
+            raise ValueError(f"Scraper source '{name}': html sources need an items selector")
+        self.name = name
+        self.url = url
+        self.format = format
+        self.items = items
+        self.fields = fields or {field: field for field in RECORD_FIELDS}
+        self.defaults = defaults or {}
+        self.pages = max(1, pages if "{page}" in url else 1)
+
+    def page_urls(self, keyword: Optional[str], region: Optional[str], type_filter: Optional[str]) -> List[str]:
+        values = {
+            "keyword": quote_plus(keyword or ""),
+            "region": quote_plus(region or ""),
+            "type": quote_plus(type_filter or ""),
+        }
+        return [self.url.format(page=page, **values) for page in range(1, self.pages + 1)]
+
+    def parse_spec(self) -> dict:
+        """What page_parser.parse_page needs, as plain (picklable) data"""
+        return {"format": self.format, "items": self.items, "fields": self.fields, "defaults": self.defaults}
+
+    def unfiltered(self, keyword: Optional[str], region: Optional[str], type_filter: Optional[str]) -> dict:
+        """Filters this source's URL cannot express"""
+        return {
+            name: value
+            for name, value in (("keyword", keyword), ("region", region), ("type", type_filter))
+            if value and "{" + name + "}" not in self.url
+        }
+
+def load_sources(config: Optional[str] = None) -> List[ScraperSource]:
+    """Sources from SCRAPER_SOURCES, or the file named by SCRAPER_SOURCES_FILE"""
+    if config is None:
+        config = os.environ.get("SCRAPER_SOURCES", "")
+        path = os.environ.get("SCRAPER_SOURCES_FILE")
+        if not config.strip() and path:
+            with open(path) as f:
+                config = f.read()
+    return [ScraperSource(**entry) for entry in json.loads(config)] if config.strip() else []
+
+class RateLimiter:
+    """Token bucket shared by every request of a run"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class ScraperEngine:
+    """Fetches and parses every source concurrently within per-host and global limits"""
+
+    def __init__(
+        self,
+        sources: Optional[List[ScraperSource]] = None,
+        max_connections: int = SCRAPER_MAX_CONNECTIONS,
+        per_host: int = SCRAPER_PER_HOST,
+        rate_limit: float = SCRAPER_RATE_LIMIT,
+        timeout: float = SCRAPER_TIMEOUT,
+        retries: int = SCRAPER_RETRIES,
+        backoff_base: float = SCRAPER_BACKOFF_BASE,
+        backoff_max: float = SCRAPER_BACKOFF_MAX,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        fetch_cache: Optional[FetchCache] = None,
+        parse_workers: int = SCRAPER_PARSE_WORKERS,
+        parse_queue: int = SCRAPER_PARSE_QUEUE
+    ):
+        self.sources = sources if sources is not None else load_sources()
+        self.max_connections = max_connections
+        self.per_host = per_host
+        self.rate_limit = rate_limit
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.transport = transport
+        self.fetch_cache = fetch_cache
+        self.parse_workers = parse_workers
+        self.parse_queue = max(1, parse_queue)
+        self._parse_pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self.last_run: Optional[dict] = None
+
+    def parse_pool(self) -> Optional[ProcessPoolExecutor]:
+        """Parser processes, started on first use and shared by every run"""
+        with self._pool_lock:
+            if self._parse_pool is None and self.parse_workers > 0:
+                self._parse_pool = make_parse_pool(self.parse_workers)
+            return self._parse_pool
+
+    def close(self):
+        """Stop the parser processes"""
+        with self._pool_lock:
+            if self._parse_pool is not None:
+                self._parse_pool.shutdown(cancel_futures=True)
+                self._parse_pool = None
+
+    def _client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections
+            ),
+            timeout=httpx.Timeout(self.timeout),
+            headers={"User-Agent": SCRAPER_USER_AGENT},
+            follow_redirects=True,
+            transport=self.transport
+        )
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        # Full jitter: anywhere up to the exponential cap
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def fetch(self, run: "_Run", url: str, headers: Optional[dict] = None) -> httpx.Response:
+        """GET url within the run's limits, retrying transient failures (2xx/3xx returned)"""
+        host = urlsplit(url).netloc
+        semaphore = run.hosts.setdefault(host, asyncio.Semaphore(self.per_host))
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            async with semaphore:
+                await run.limiter.acquire()
+                run.stats["requests"] += 1
+                try:
+                    response = await run.client.get(url, headers=headers)
+                except httpx.TransportError as e:
+                    # Timeouts and connection errors
+                    error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+                else:
+                    if response.status_code < 400:
+                        return response
+                    error = f"HTTP {response.status_code}"
+                    if response.status_code not in RETRY_STATUSES:
+                        raise ScrapeError(f"{url}: {error}")
+                    retry_after = response.headers.get("retry-after")
+            if attempt == self.retries:
+                break
+            run.stats["retries"] += 1
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+        raise ScrapeError(f"{url}: {error} after {self.retries + 1} attempts")
+
+    async def fetch_page(self, run: "_Run", index: Tuple[int, int], source: ScraperSource, url: str, filters: dict):
+        """Fetch stage: queue a page for parsing unless it is unchanged since last stored"""
+        try:
+            await self._fetch_page(run, index, source, url, filters)
+        except Exception as e:
+            run.page_failed(source, e)
+
+    async def _fetch_page(self, run: "_Run", index: Tuple[int, int], source: ScraperSource, url: str, filters: dict):
+        key = cache_key(url, filters)
+        cached = run.cached.get(key)
+        headers = {}
+        if cached and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = await self.fetch(run, url, headers)
+        page = {
+            "key": key,
+            "url": url,
+            "etag": response.headers.get("etag") or (cached and cached["etag"]),
+            "last_modified": response.headers.get("last-modified") or (cached and cached["last_modified"]),
+        }
+        if response.status_code == 304 and cached:
+            run.stats["not_modified"] += 1
+            run.pages.append({**page, "content_hash": cached["content_hash"], "changed": False})
+            return
+
+        body = response.content
+        run.stats["bytes"] += len(body)
+        digest = content_hash(body)
+        if cached and cached["content_hash"] == digest:
+            run.stats["unchanged"] += 1
+            run.pages.append({**page, "content_hash": digest, "changed": False})
+            return
+
+        # Waits while the parse stage is behind
+        await run.parse_queue.put((index, source, url, filters, body, {**page, "content_hash": digest, "changed": True}))
+
+    async def parse_pages(self, run: "_Run", pool: Optional[ProcessPoolExecutor]):
+        """Parse stage: turn queued pages into records until the None sentinel"""
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await run.parse_queue.get()
+            if item is None:
+                return
+            index, source, url, filters, body, page = item
+            try:
+                if pool is None:
+                    records = parse_page(source.parse_spec(), body, url, filters)
+                else:
+                    records = await loop.run_in_executor(pool, parse_page, source.parse_spec(), body, url, filters)
+            except Exception as e:
+                run.page_failed(source, e)
+                continue
+            run.stats["changed"] += 1
+            run.pages.append(page)
+            # Waits while the consumer is behind
+            await run.output.put((index, records))
+
+    async def _plan(
+        self, keyword: Optional[str], region: Optional[str], type_filter: Optional[str], use_cache: bool
+    ) -> Tuple[list, Dict[str, dict]]:
+        """(source, page URLs, unfiltered) per source, and the fetch cache entries of those pages"""
+        plan = [
+            (source, source.page_urls(keyword, region, type_filter), source.unfiltered(keyword, region, type_filter))
+            for source in self.sources
+        ]
+        cached = {}
+        if self.fetch_cache is not None and use_cache:
+            keys = [cache_key(url, filters) for _, urls, filters in plan for url in urls]
+            cached = await asyncio.to_thread(self.fetch_cache.load, keys)
+        return plan, cached
+
+    async def _parsed(
+        self, run: "_Run", plan: list, pool: Optional[ProcessPoolExecutor]
+    ) -> AsyncIterator[Tuple[Tuple[int, int], List[dict]]]:
+        """Run the fetch and parse stages, yielding (page index, records) as pages are parsed"""
+        # One parse task per worker process keeps every process busy
+        parsers = [asyncio.create_task(self.parse_pages(run, pool)) for _ in range(max(1, self.parse_workers))]
+
+        async def fetch_all():
+            try:
+                await asyncio.gather(*(
+                    self.fetch_page(run, (source_index, page_index), source, url, filters)
+                    for source_index, (source, urls, filters) in enumerate(plan)
+                    for page_index, url in enumerate(urls)
+                ))
+                for _ in parsers:
+                    await run.parse_queue.put(None)
+                await asyncio.gather(*parsers)
+            finally:
+                await run.output.put(None)
+
+        fetcher = asyncio.create_task(fetch_all())
+        try:
+            while True:
+                item = await run.output.get()
+                if item is None:
+                    break
+                yield item
+            await fetcher
+        finally:
+            for task in (fetcher, *parsers):
+                task.cancel()
+
+    def _finish(self, run: "_Run", opportunities: int, started: float):
+        run.stats["opportunities"] = opportunities
+        run.stats["seconds"] = round(time.monotonic() - started, 3)
+        self.last_run = {**run.stats, "errors": run.errors[:10]}
+        print(
+            f"✅ Scraped {opportunities} opportunities from {len(self.sources)} sources "
+            f"({run.stats['requests']} requests, {run.stats['retries']} retries, "
+            f"{run.stats['not_modified'] + run.stats['unchanged']} unchanged pages) in {run.stats['seconds']}s"
+        )
+
+    async def scrape(
+        self,
+        keyword: Optional[str] = None,
+        region: Optional[str] = None,
+        type_filter: Optional[str] = None,
+        use_cache: bool = True
+    ) -> ScrapeResult:
+        """
+        Opportunities from every source matching the filters, one record per URL
+        Pages unchanged since they were last stored contribute no records,
+        unless use_cache=False
+        """
+        if not self.sources:
+            print(f"⚠️ No scraper sources configured (SCRAPER_SOURCES). Keyword: {keyword}")
+            return ScrapeResult()
+
+        started = time.monotonic()
+        plan, cached = await self._plan(keyword, region, type_filter, use_cache)
+        pool = await asyncio.to_thread(self.parse_pool)
+        parsed = {}
+        async with self._client() as client:
+            run = _Run(client, RateLimiter(self.rate_limit), cached, self.parse_queue)
+            async for index, records in self._parsed(run, plan, pool):
+                parsed[index] = records
+
+        # Source and page order, whatever order the pages were parsed in
+        opportunities = list(_unique((record for index in sorted(parsed) for record in parsed[index]), set()))
+        self._finish(run, len(opportunities), started)
+        return ScrapeResult(opportunities, run.pages)
+
+    def stream(
+        self,
+        keyword: Optional[str] = None,
+        region: Optional[str] = None,
+        type_filter: Optional[str] = None,
+        use_cache: bool = True
+    ) -> ScrapeStream:
+        """
+        scrape() as an async iterator: each page's records are yielded once it
+        is parsed (parse order, first record per URL), so the whole result is
+        never held at once. Pass the stream to commit() once it is stored
+        """
+        return ScrapeStream(self, keyword, region, type_filter, use_cache)
+
+    async def _stream(
+        self,
+        keyword: Optional[str],
+        region: Optional[str],
+        type_filter: Optional[str],
+        use_cache: bool,
+        pages: List[dict]
+    ) -> AsyncIterator[dict]:
+        if not self.sources:
+            print(f"⚠️ No scraper sources configured (SCRAPER_SOURCES). Keyword: {keyword}")
+            return
+
+        started = time.monotonic()
+        plan, cached = await self._plan(keyword, region, type_filter, use_cache)
+        pool = await asyncio.to_thread(self.parse_pool)
+        seen = set()
+        async with self._client() as client:
+            run = _Run(client, RateLimiter(self.rate_limit), cached, self.parse_queue, pages)
+            async for _, records in self._parsed(run, plan, pool):
+                for record in _unique(records, seen):
+                    yield record
+        self._finish(run, len(seen), started)
+
+    def commit(self, result: List[dict]):
+        """Record the pages of a scrape whose records were stored, so unchanged ones are skipped next time"""
+        pages = getattr(result, "pages", None)
+        if self.fetch_cache is not None and pages:
+            self.fetch_cache.save(pages)
+
+    def scrape_sync(
+        self,
+        keyword: Optional[str] = None,
+        region: Optional[str] = None,
+        type_filter: Optional[str] = None,
+        use_cache: bool = True
+    ) -> ScrapeResult:
+        """scrape() on a private event loop, for threads without a running loop"""
+        return asyncio.run(self.scrape(keyword, region, type_filter, use_cache))
+
+class _Run:
+    """Client and limits shared by the requests of one scrape"""
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        limiter: RateLimiter,
+        cached: Optional[Dict[str, dict]] = None,
+        parse_queue: int = SCRAPER_PARSE_QUEUE,
+        pages: Optional[List[dict]] = None
+    ):
+        self.client = client
+        self.limiter = limiter
+        self.cached = cached or {}
+        self.parse_queue: asyncio.Queue = asyncio.Queue(maxsize=parse_queue)
+        # Parsed pages' records on their way to the consumer
+        self.output: asyncio.Queue = asyncio.Queue(maxsize=parse_queue)
+        self.hosts: Dict[str, asyncio.Semaphore] = {}
+        self.stats = {
+            "requests": 0, "retries": 0, "failed_pages": 0,
+            "changed": 0, "not_modified": 0, "unchanged": 0, "bytes": 0,
+        }
+        self.errors: List[str] = []
+        self.pages: List[dict] = pages if pages is not None else []
+
+    def page_failed(self, source: ScraperSource, error: Exception):
+        self.stats["failed_pages"] += 1
+        self.errors.append(f"{source.name}: {error}")
+        print(f"❌ Scraper source '{source.name}' page failed: {error}")
@@ -0,0 +1,335 @@
+# In-memory search engine for the opportunity catalog
+#
+# The whole opportunities table is loaded once into an inverted index
+# (term -> sorted posting list of row positions) with columnar field storage,
+# so /search can be answered without a database round trip.
+#
+# The index is made of immutable segments. Ingests add a small segment for the
+# changed rows and publish a new snapshot; readers always work on the snapshot
+# they picked up, so they never wait for an update or a compaction.
+#
+# Ingests of this process update the index directly (ingest listener). Rows
+# stored by other processes (other API workers, the external scheduler) are
+# caught up by a background thread every MEMORY_INDEX_SYNC_SECONDS: it
+# re-reads the rows whose change time moved since the last sync, and reloads
+# everything when rows were deleted.
+
+import heapq
+import os
+import threading
+from array import array
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from database_setup import Opportunity, SessionLocal
+from services.db_service import RESULT_FIELDS  # columns of each result, as opportunity_to_dict
+
+# Set SEARCH_ENGINE=memory to serve /search from the in-process index
+MEMORY_SEARCH_ENABLED = os.environ.get("SEARCH_ENGINE", "").lower() == "memory"
+
+# Columns searched by keyword terms (same as search_opportunities_db)
+SEARCH_FIELDS = ("title", "description", "type", "organization", "location", "tags")
+
+# Merge all segments into one once an ingest pushes the count past this
+MAX_SEGMENTS = 8
+
+# How often rows stored by other processes are caught up (0 disables)
+MEMORY_INDEX_SYNC_SECONDS = float(os.environ.get("MEMORY_INDEX_SYNC_SECONDS", "10"))
+
+# Change times are re-checked this far back: a transaction can commit rows
+# stamped before the newest change an earlier sync already saw
+MEMORY_INDEX_SYNC_OVERLAP_SECONDS = float(os.environ.get("MEMORY_INDEX_SYNC_OVERLAP_SECONDS", "300"))
+
+_CHANGED_AT = func.coalesce(Opportunity.updated_at, Opportunity.created_at)
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+def _row_from_model(opp: Opportunity) -> dict:
+    return {
+        'id': opp.id,
+        'title': opp.title,
+        'description': opp.description,
+        'type': opp.type,
+        'organization': opp.organization,
+        'location': opp.location,
+        'deadline': _isoformat(opp.deadline),
+        'url': opp.url,
+        'tags': opp.tags,
+        'is_verified': opp.is_verified,
+        'created_at': _isoformat(opp.created_at),
+        'updated_at': _isoformat(opp.updated_at),
+        '_created_at': opp.created_at,
+    }
+
+def _as_datetime(value):
+    # SQLite returns aggregates over datetime columns as text
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+def _sort_key(created_at: Optional[datetime], row_id: int) -> Tuple[float, int]:
+    # Order on the timestamp value so naive and aware datetimes never get compared
+    return (created_at.timestamp() if created_at else float("-inf"), row_id)
+
+class _Segment:
+    """Immutable block of rows: columnar storage plus an inverted index over it"""
+
+    __slots__ = ("ids", "columns", "sort_keys", "location_lower", "type_lower",
+                 "postings", "_term_cache", "_lock")
+
+    def __init__(self, rows: List[dict], sort_keys: Optional[List[Tuple[float, int]]] = None):
+        self.ids = array("q", (row['id'] for row in rows))
+        self.columns = {field: [row[field] for row in rows] for field in RESULT_FIELDS}
+        if sort_keys is None:
+            sort_keys = [_sort_key(row['_created_at'], row['id']) for row in rows]
+        self.sort_keys = sort_keys
+        self.location_lower = [(row['location'] or "").lower() for row in rows]
+        self.type_lower = [(row['type'] or "").lower() for row in rows]
+
+        # Tokens are whitespace-separated words, so "term is a substring of some
+        # token" is exactly "column ILIKE '%term%'" for a whitespace-free term
+        postings: Dict[str, array] = {}
+        for pos, row in enumerate(rows):
+            tokens = set()
+            for field in SEARCH_FIELDS:
+                if row[field]:
+                    tokens.update(row[field].lower().split())
+            for token in tokens:
+                posting = postings.get(token)
+                if posting is None:
+                    posting = postings[token] = array("I")
+                posting.append(pos)  # positions are appended in order, so lists stay sorted
+        self.postings = postings
+
+        self._term_cache: Dict[str, frozenset] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def positions_for_term(self, term: str) -> frozenset:
+        """Positions of rows with a token containing term (cached per segment)"""
+        cached = self._term_cache.get(term)
+        if cached is not None:
+            return cached
+
+        exact = self.postings.get(term)
+        matched = set(exact) if exact is not None else set()
+        for token, posting in self.postings.items():
+            if term in token and token != term:
+                matched.update(posting)
+        result = frozenset(matched)
+
+        with self._lock:
+            if len(self._term_cache) > 4096:
+                self._term_cache.clear()
+            self._term_cache[term] = result
+        return result
+
+    def row(self, pos: int) -> dict:
+        return {field: self.columns[field][pos] for field in RESULT_FIELDS}
+
+class _Snapshot:
+    """Segments plus the current location of every live row id"""
+
+    __slots__ = ("segments", "locations")
+
+    def __init__(self, segments: Tuple[_Segment, ...], locations: Dict[int, Tuple[int, int]]):
+        self.segments = segments
+        self.locations = locations
+
+class InMemorySearchIndex:
+    """Inverted index over the opportunities table with incremental updates"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        sync_interval: float = MEMORY_INDEX_SYNC_SECONDS,
+        sync_overlap: float = MEMORY_INDEX_SYNC_OVERLAP_SECONDS
+    ):
+        self._snapshot: Optional[_Snapshot] = None
+        self._write_lock = threading.Lock()
+        self.session_factory = session_factory
+        self.sync_interval = sync_interval
+        self.sync_overlap = timedelta(seconds=sync_overlap)
+        self._synced_to: Optional[datetime] = None  # newest change time seen in the database
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    def __len__(self):
+        snapshot = self._snapshot
+        return len(snapshot.locations) if snapshot else 0
+
+    def load(self, db: Session):
+        """Build the index from the full opportunities table"""
+        # Read before the rows, so changes made while loading are caught up later
+        synced_to = _as_datetime(db.query(func.max(_CHANGED_AT)).scalar())
+        rows = [_row_from_model(opp) for opp in db.query(Opportunity).yield_per(1000)]
+        segment = _Segment(rows)
+        locations = {row_id: (0, pos) for pos, row_id in enumerate(segment.ids)}
+        with self._write_lock:
+            self._snapshot = _Snapshot((segment,), locations)
+            self._synced_to = synced_to
+        print(f"✅ In-memory search index loaded: {len(locations)} opportunities")
+
+    def refresh(self, db: Session, opportunity_ids: List[int]):
+        """
+        Re-read the given rows and publish them as a new segment
+        Used as a store_opportunities ingest listener
+        """
+        if not opportunity_ids or self._snapshot is None:
+            return
+
+        ids = set(opportunity_ids)
+        rows = [
+            _row_from_model(opp)
+            for opp in db.query(Opportunity).filter(Opportunity.id.in_(ids))
+        ]
+
+        with self._write_lock:
+            current = self._snapshot
+            segments = current.segments
+            locations = dict(current.locations)
+
+            for missing in ids - {row['id'] for row in rows}:
+                locations.pop(missing, None)  # row was deleted
+
+            if rows:
+                segment = _Segment(rows)
+                seg_no = len(segments)
+                segments = segments + (segment,)
+                for pos, row_id in enumerate(segment.ids):
+                    locations[row_id] = (seg_no, pos)
+
+            snapshot = _Snapshot(segments, locations)
+            if len(snapshot.segments) > MAX_SEGMENTS:
+                snapshot = self._compact(snapshot)
+            self._snapshot = snapshot
+
+    def _indexed_updated_at(self, snapshot: _Snapshot, row_id: int) -> Optional[str]:
+        seg_no, pos = snapshot.locations[row_id]
+        return snapshot.segments[seg_no].columns["updated_at"][pos]
+
+    def catch_up(self, db: Session) -> int:
+        """
+        Re-read rows other processes inserted or updated since the last sync;
+        reload everything if rows were deleted. Returns: rows re-read
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return 0
+
+        query = db.query(Opportunity.id, Opportunity.updated_at, _CHANGED_AT)
+        if self._synced_to is not None:
+            query = query.filter(_CHANGED_AT >= self._synced_to - self.sync_overlap)
+        changed = query.all()
+        stale = [
+            row_id for row_id, updated_at, _ in changed
+            if row_id not in snapshot.locations
+            or self._indexed_updated_at(snapshot, row_id) != _isoformat(updated_at)
+        ]
+        if stale:
+            self.refresh(db, stale)
+        if changed:
+            newest = max(_as_datetime(changed_at) for _, _, changed_at in changed)
+            self._synced_to = max(self._synced_to, newest) if self._synced_to else newest
+
+        if db.query(func.count(Opportunity.id)).scalar() != len(self):
+            self.load(db)
+        return len(stale)
+
+    def _run(self):
+        while not self._stop.wait(self.sync_interval):
+            try:
+                db = self.session_factory()
+                try:
+                    self.catch_up(db)
+                finally:
+                    db.close()
+            except Exception as e:
+                print(f"⚠️ In-memory search index sync failed: {e}")
+
+    def start(self):
+        """Catch up with other processes' ingests in a background thread"""
+        if self.sync_interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="memory-index-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.sync_interval)
+            self._thread = None
+
+    @staticmethod
+    def _compact(snapshot: _Snapshot) -> _Snapshot:
+        """Merge the live rows of every segment into a single segment"""
+        rows, sort_keys = [], []
+        for seg_no, pos in snapshot.locations.values():
+            segment = snapshot.segments[seg_no]
+            rows.append(segment.row(pos))
+            sort_keys.append(segment.sort_keys[pos])
+
+        segment = _Segment(rows, sort_keys)
+        locations = {row_id: (0, pos) for pos, row_id in enumerate(segment.ids)}
+        return _Snapshot((segment,), locations)
+
+    def search(
+        self,
+        keyword: Optional[str] = None,
+        region: Optional[str] = None,
+        type_filter: Optional[str] = None,
+        limit: int = 100,
+        after: Optional[Tuple[datetime, int]] = None
+    ) -> List[dict]:
+        """
+        Same semantics as search_opportunities_db(mode="ilike"): every keyword
+        term must appear in one of the searchable columns, region and type are
+        substring filters, newest first, optionally after a keyset cursor
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return []
+
+        terms = keyword.lower().split() if keyword else []
+        region = region.lower() if region else None
+        type_filter = type_filter.lower() if type_filter else None
+        after_key = _sort_key(*after) if after else None
+
+        candidates = []
+        for seg_no, segment in enumerate(snapshot.segments):
+            if terms:
+                # Intersect smallest posting sets first
+                sets = sorted((segment.positions_for_term(term) for term in terms), key=len)
+                positions = set(sets[0])
+                for other in sets[1:]:
+                    if not positions:
+                        break
+                    positions &= other
+            else:
+                positions = range(len(segment))
+
+            for pos in positions:
+                row_id = segment.ids[pos]
+                if snapshot.locations.get(row_id) != (seg_no, pos):
+                    continue  # superseded by a newer segment
+                if region and region not in segment.location_lower[pos]:
+                    continue
+                if type_filter and type_filter not in segment.type_lower[pos]:
+                    continue
+                if after_key and segment.sort_keys[pos] >= after_key:
+                    continue
+                candidates.append((segment.sort_keys[pos], seg_no, pos))
+
+        top = heapq.nlargest(limit, candidates)
+        return [snapshot.segments[seg_no].row(pos) for _, seg_no, pos in top]
+
+# Process-wide index used by main_with_db.py when MEMORY_SEARCH_ENABLED
+memory_index = InMemorySearchIndex()
@@ -0,0 +1,64 @@
+# Highlighted description excerpts for list views
+#
+# The database returns only a bounded prefix of the description
+# (SNIPPET_SOURCE_CHARS); the excerpt is cut from it around the first matched
+# keyword term, HTML-escaped, with every term occurrence in <mark>.
+
+import html
+import re
+from typing import List, Optional
+
+# Characters of description the excerpt is taken from (pushed down as substr())
+SNIPPET_SOURCE_CHARS = 1000
+
+# Target excerpt length in characters
+SNIPPET_LENGTH = 160
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+ELLIPSIS = "…"
+
+def terms_pattern(keyword: Optional[str]) -> Optional["re.Pattern"]:
+    """Case-insensitive pattern matching any keyword term (substring match, like ilike)"""
+    terms = sorted(set(keyword.lower().split()), key=len, reverse=True) if keyword else []
+    if not terms:
+        return None
+    return re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+
+def _cut(text: str, start: int, end: int) -> str:
+    # Move the window edges to word boundaries
+    if start > 0:
+        space = text.find(" ", start, start + 20)
+        start = space + 1 if space != -1 else start
+    if end < len(text):
+        space = text.rfind(" ", end - 20, end)
+        end = space if space > start else end
+    return text[start:end]
+
+def make_snippet(text: Optional[str], pattern: Optional["re.Pattern"], length: int = SNIPPET_LENGTH) -> Optional[str]:
+    """Excerpt of text around the first match of pattern, matches wrapped in <mark>"""
+    if not text:
+        return text
+
+    text = " ".join(text.split())
+    match = pattern.search(text) if pattern else None
+    if match is None or len(text) <= length:
+        start = 0
+    else:
+        # Put the first match about a third of the way into the excerpt
+        start = max(0, min(match.start() - length // 3, len(text) - length))
+    end = min(len(text), start + length)
+
+    excerpt = _cut(text, start, end)
+    parts: List[str] = []
+    position = 0
+    if pattern:
+        for found in pattern.finditer(excerpt):
+            parts.append(html.escape(excerpt[position:found.start()]))
+            parts.append(HIGHLIGHT_START + html.escape(found.group()) + HIGHLIGHT_END)
+            position = found.end()
+    parts.append(html.escape(excerpt[position:]))
+
+    prefix = ELLIPSIS if start > 0 else ""
+    suffix = ELLIPSIS if end < len(text) else ""
+    return prefix + "".join(parts) + suffix
@@ -0,0 +1,51 @@
+# Trigram similarity helpers (pg_trgm semantics) for databases without pg_trgm
+
+import re
+from functools import lru_cache
+from typing import FrozenSet, List, Optional
+
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+def _words(value: Optional[str]) -> List[str]:
+    return WORD_PATTERN.findall(value.lower()) if value else []
+
+def _word_trigrams(word: str) -> FrozenSet[str]:
+    """pg_trgm pads each word with two leading spaces and one trailing space"""
+    padded = f"  {word} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+@lru_cache(maxsize=4096)
+def trigrams(value: Optional[str]) -> FrozenSet[str]:
+    """Set of trigrams for every word in value"""
+    result = set()
+    for word in _words(value):
+        result |= _word_trigrams(word)
+    return frozenset(result)
+
+def _jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+def similarity(a: Optional[str], b: Optional[str]) -> float:
+    """Equivalent of pg_trgm similarity(a, b)"""
+    return _jaccard(trigrams(a), trigrams(b))
+
+def word_similarity(a: Optional[str], b: Optional[str]) -> float:
+    """
+    Equivalent of pg_trgm word_similarity(a, b): best similarity between a
+    and any run of consecutive words in b of about the same length as a
+    """
+    query = trigrams(a)
+    words = _words(b)
+    if not query or not words:
+        return 0.0
+
+    query_len = max(len(_words(a)), 1)
+    best = 0.0
+    for size in {max(query_len - 1, 1), query_len, query_len + 1}:
+        for start in range(max(len(words) - size + 1, 1)):
+            window = frozenset().union(*(_word_trigrams(w) for w in words[start:start + size]))
+            best = max(best, _jaccard(query, window))
+    return best
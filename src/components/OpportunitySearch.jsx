@@ -1,10 +1,11 @@
 import React, { useState } from 'react';
 import { Search, Loader2, ExternalLink } from 'lucide-react';
-import { searchOpportunities } from '@/lib/railwayApiClient';
+import { searchOpportunities, LIST_FIELDS } from '@/lib/railwayApiClient';
 import { useToast } from "@/components/ui/use-toast";
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
+import Snippet from '@/components/Snippet';
 
 /**
  * OpportunitySearch Component
@@ -32,6 +33,8 @@ export default function OpportunitySearch() {
     try {
       const opportunities = await searchOpportunities({
         keyword: query,
+        // Only what the cards show: a highlighted snippet instead of the full description
+        fields: LIST_FIELDS,
         // Optional: type: 'scholarship' | 'fellowship' | 'accelerator'
         // Optional: region: 'USA' | 'Europe' | etc.
       });
@@ -123,7 +126,9 @@ export default function OpportunitySearch() {
                       {opportunity.title}
                     </CardTitle>
                     <CardDescription className="text-gray-400 mt-2">
-                      {opportunity.description}
+                      {opportunity.snippet
+                        ? <Snippet text={opportunity.snippet} />
+                        : opportunity.description}
                     </CardDescription>
                   </div>
                   {opportunity.url && (
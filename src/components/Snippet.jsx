@@ -0,0 +1,32 @@
+import React from 'react';
+
+// Entities produced by the API's HTML escaping (Python html.escape)
+const ENTITIES = { '&amp;': '&', '&lt;': '<', '&gt;': '>', '&quot;': '"', '&#x27;': "'" };
+
+const unescapeHtml = (text) => text.replace(/&(?:amp|lt|gt|quot|#x27);/g, (entity) => ENTITIES[entity]);
+
+/**
+ * Snippet Component
+ * Renders an API snippet (HTML-escaped text with matched terms in <mark>)
+ * as React elements: only the <mark> tags are honoured, everything else is
+ * shown as text, so no HTML from scraped descriptions is ever injected
+ */
+export default function Snippet({ text, className }) {
+  if (!text) return null;
+
+  // Odd parts are the highlighted terms
+  const parts = text.split(/<mark>(.*?)<\/mark>/);
+  return (
+    <span className={className}>
+      {parts.map((part, index) => (
+        index % 2 === 1 ? (
+          <mark key={index} className="bg-neon-blue/30 text-white rounded px-0.5">
+            {unescapeHtml(part)}
+          </mark>
+        ) : (
+          <React.Fragment key={index}>{unescapeHtml(part)}</React.Fragment>
+        )
+      ))}
+    </span>
+  );
+}
@@ -40,12 +40,19 @@ async function apiRequest(endpoint, options = {}) {
   }
 }
 
+/**
+ * Fields needed by list views: 'snippet' is a short description excerpt
+ * with the matched terms wrapped in <mark> (HTML-escaped)
+ */
+export const LIST_FIELDS = ['id', 'title', 'organization', 'type', 'location', 'deadline', 'url', 'snippet'];
+
 /**
  * Search for opportunities on the web
  * @param {Object} params - Search parameters
  * @param {string} params.keyword - Search keyword/query
  * @param {string} params.region - Region filter (optional)
  * @param {string} params.type - Type filter: 'scholarship', 'fellowship', 'accelerator' (optional)
+ * @param {string[]} params.fields - Fields to return, e.g. LIST_FIELDS (optional, default: all)
  * @returns {Promise<Array>} - Array of opportunities
  */
 export async function searchOpportunities(params) {
@@ -54,6 +61,7 @@ export async function searchOpportunities(params) {
   if (params.keyword || params.query) queryParams.append('keyword', params.keyword || params.query);
   if (params.region) queryParams.append('region', params.region);
   if (params.type || params.category) queryParams.append('type', params.type || params.category);
+  if (params.fields) queryParams.append('fields', params.fields.join(','));
   
   console.log('🔍 Search Parameters:', params); // Debug log
   
@@ -2,7 +2,8 @@ import React, { useState } from 'react';
 import { Helmet } from 'react-helmet';
 import { ArrowLeft, MoveRight, Search, Loader2, ExternalLink } from 'lucide-react';
 import { Link } from 'react-router-dom';
-import { searchOpportunities } from '@/lib/railwayApiClient';
+import { searchOpportunities, LIST_FIELDS } from '@/lib/railwayApiClient';
+import Snippet from '@/components/Snippet';
 import { useToast } from "@/components/ui/use-toast";
 
 /**
@@ -33,6 +34,8 @@ export default function WorkingSearchDemoPage() {
     try {
       const opportunities = await searchOpportunities({
         keyword: query,
+        // Only what the cards show: a highlighted snippet instead of the full description
+        fields: LIST_FIELDS,
       });
 
       const resultArray = opportunities.opportunities || opportunities || [];
@@ -180,7 +183,9 @@ export default function WorkingSearchDemoPage() {
                         )}
                       </div>
                       <p className="text-gray-400 mb-3">
-                        {opportunity.description || opportunity.organization || 'No description available'}
+                        {opportunity.snippet
+                          ? <Snippet text={opportunity.snippet} />
+                          : opportunity.description || opportunity.organization || 'No description available'}
                       </p>
                       <div className="flex flex-wrap gap-2 text-sm">
                         {opportunity.type && (
@@ -0,0 +1,26 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Modules are imported from the repository root, as main_with_db.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database_setup connects at import: a throwaway SQLite file unless DATABASE_URL is set
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+
+@pytest.fixture
+def db():
+    """Session on the test database, every table emptied first"""
+    from database_setup import Base, SessionLocal, engine, init_db
+
+    init_db()
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,70 @@
+# Near-duplicate merging (services/dedupe.py)
+
+from datetime import date
+
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql
+
+from database_setup import Opportunity
+from services.db_service import upsert_opportunities
+from services.dedupe import backfill_canonical_urls, canonical_url, fill_values
+
+def test_canonical_url_keeps_scheme_port_and_encoding():
+    assert canonical_url("http://www.Example.org:8080/a/?utm_source=x&q=a%20b") == "http://example.org:8080/a?q=a%20b"
+    assert canonical_url("https://example.org:443/a#top") == "https://example.org/a"
+
+def test_fill_values_leaves_date_columns_without_nullif():
+    # '' compared with a DATE column is an error on Postgres
+    table = Opportunity.__table__
+    stmt = update(table).values(fill_values({"deadline": date(2027, 1, 15), "location": "UK"}))
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert "deadline=coalesce(opportunities.deadline," in sql
+    assert "location=coalesce(nullif(opportunities.location," in sql
+
+def test_near_duplicate_merge_fills_deadline(db):
+    description = "Full funding for graduate study in the United Kingdom for one year at any university " * 3
+    upsert_opportunities([{
+        "title": "Chevening Scholarship 2027",
+        "organization": "FCDO",
+        "description": description,
+        "url": "https://chevening.org/scholarship",
+    }], db)
+
+    report = upsert_opportunities([{
+        "title": "Chevening Scholarship 2027",
+        "organization": "FCDO",
+        "description": description,
+        "url": "https://aggregator.com/listing/123",
+        "deadline": "2027-01-15",
+        "location": "UK",
+    }], db)
+
+    assert report["merged"] == 1 and report["new"] == 0
+    stored = db.query(Opportunity).one()
+    assert stored.deadline == date(2027, 1, 15)
+    assert stored.location == "UK"
+
+def test_rescrape_under_another_url_form_updates_stored_row(db):
+    upsert_opportunities([{"title": "Fellowship", "url": "http://example.org:8080/a/?utm_source=x"}], db)
+
+    report = upsert_opportunities([{"title": "Fellowship", "url": "http://EXAMPLE.org:8080/a", "location": "Kenya"}], db)
+
+    assert report["new"] == 0 and report["updated"] == 1
+    stored = db.query(Opportunity).one()
+    # The URL shown to users stays the scraped one
+    assert stored.url == "http://example.org:8080/a/?utm_source=x"
+    assert stored.canonical_url == "http://example.org:8080/a"
+    assert stored.location == "Kenya"
+
+def test_backfill_fills_canonical_url_without_touching_urls(db):
+    db.add_all([
+        Opportunity(title="A", url="https://www.example.org/a/"),
+        Opportunity(title="A", url="https://example.org/a?utm_medium=mail"),
+    ])
+    db.commit()
+
+    assert backfill_canonical_urls(db) == (2, 1)
+    assert sorted(opp.url for opp in db.query(Opportunity)) == [
+        "https://example.org/a?utm_medium=mail", "https://www.example.org/a/"
+    ]
+    assert {opp.canonical_url for opp in db.query(Opportunity)} == {"https://example.org/a"}
@@ -0,0 +1,201 @@
+# ScraperEngine against a real HTTP server on 127.0.0.1 (http.server in a thread): no network
+
+import asyncio
+import json
+import socket
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from services.scraper_engine import ScraperEngine, ScraperSource
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        status, body, headers = self.server.respond(self.path)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def _page(path: str):
+    """A JSON page with one record named after the source and page number"""
+    parts = urlsplit(path)
+    source = parts.path.split("/")[1]
+    page = parse_qs(parts.query)["page"][0]
+    item = {"title": f"Grant {source} {page}", "url": f"https://{source}.example/{page}"}
+    return 200, json.dumps({"results": [item]}).encode(), {"Content-Type": "application/json"}
+
+@pytest.fixture
+def server():
+    """Local server on a free port; tests replace server.respond(path) -> (status, body, headers)"""
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.daemon_threads = True
+    httpd.respond = _page
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def _source(server, name: str, pages: int = 1) -> ScraperSource:
+    host, port = server.server_address[:2] if server else ("127.0.0.1", _closed_port())
+    return ScraperSource(
+        name=name,
+        url=f"http://{host}:{port}/{name}/search?page={{page}}",
+        items="results",
+        fields={"title": "title", "url": "url"},
+        pages=pages,
+    )
+
+def _closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _engine(sources, **kwargs) -> ScraperEngine:
+    options = {
+        "per_host": 4, "rate_limit": 0, "retries": 3, "timeout": 5,
+        "backoff_base": 0.001, "backoff_max": 0.01, "parse_workers": 0,
+    }
+    options.update(kwargs)
+    return ScraperEngine(sources, **options)
+
+def test_per_host_limit(server):
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def respond(path):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.05)
+        with lock:
+            in_flight -= 1
+        return _page(path)
+
+    server.respond = respond
+    # Both sources are on the same host: the limit is shared
+    engine = _engine([_source(server, "a", pages=8), _source(server, "b", pages=8)], per_host=3)
+    records = engine.scrape_sync()
+
+    assert len(records) == 16
+    assert peak == 3
+
+def test_timeouts_are_retried_then_reported(server):
+    calls = defaultdict(int)
+
+    def respond(path):
+        calls[path] += 1
+        if path.startswith("/slow/"):
+            time.sleep(1)
+        return _page(path)
+
+    server.respond = respond
+    engine = _engine([_source(server, "slow"), _source(server, "fast")], timeout=0.2, retries=1)
+    started = time.monotonic()
+    records = engine.scrape_sync()
+
+    assert [record["title"] for record in records] == ["Grant fast 1"]
+    assert calls["/slow/search?page=1"] == 2  # first attempt plus one retry
+    assert engine.last_run["failed_pages"] == 1
+    assert "ReadTimeout" in engine.last_run["errors"][0]
+    # Neither attempt waited for the slow response
+    assert time.monotonic() - started < 1
+
+def test_connection_errors_are_reported():
+    engine = _engine([_source(None, "closed")], retries=1)
+    assert engine.scrape_sync() == []
+    assert engine.last_run["requests"] == 2
+    assert "ConnectError" in engine.last_run["errors"][0]
+
+def test_retries_429_and_5xx_with_backoff(server):
+    failures = {"/flaky/search?page=1": [503, 502], "/flaky/search?page=2": [429]}
+    calls = defaultdict(int)
+
+    def respond(path):
+        calls[path] += 1
+        pending = failures.get(path)
+        if pending:
+            return pending.pop(0), b"", {"Retry-After": "0"}
+        return _page(path)
+
+    server.respond = respond
+    engine = _engine([_source(server, "flaky", pages=3)])
+    records = engine.scrape_sync()
+
+    assert len(records) == 3
+    assert calls == {"/flaky/search?page=1": 3, "/flaky/search?page=2": 2, "/flaky/search?page=3": 1}
+    assert engine.last_run["retries"] == 3
+    assert engine.last_run["failed_pages"] == 0
+
+def test_client_errors_are_not_retried(server):
+    calls = defaultdict(int)
+
+    def respond(path):
+        calls[path] += 1
+        return 404, b"", {}
+
+    server.respond = respond
+    engine = _engine([_source(server, "gone")])
+    assert engine.scrape_sync() == []
+    assert calls["/gone/search?page=1"] == 1
+    assert engine.last_run["failed_pages"] == 1
+
+def test_failing_source_keeps_other_results(server):
+    calls = defaultdict(int)
+
+    def respond(path):
+        source = path.split("/")[1]
+        calls[source] += 1
+        if source == "down":
+            return 500, b"", {}
+        if source == "broken":
+            return 200, b"not json", {}
+        return _page(path)
+
+    server.respond = respond
+    sources = [_source(server, "down"), _source(server, "broken"), _source(server, "up", pages=2)]
+    engine = _engine(sources, retries=2)
+    records = engine.scrape_sync()
+
+    assert sorted(record["title"] for record in records) == ["Grant up 1", "Grant up 2"]
+    assert calls["down"] == 3  # first attempt plus two retries
+    assert engine.last_run["failed_pages"] == 2
+    assert {error.split(":")[0] for error in engine.last_run["errors"]} == {"down", "broken"}
+
+def test_stream_yields_records_while_pages_are_fetched(server):
+    served = []
+
+    def respond(path):
+        served.append(path)
+        time.sleep(0.01)
+        return _page(path)
+
+    server.respond = respond
+    engine = _engine([_source(server, "a", pages=6)], per_host=1, parse_queue=1)
+    stream = engine.stream()
+
+    async def consume():
+        seen_before = []
+        async for record in stream:
+            seen_before.append(len(served))
+        return seen_before
+
+    seen_before = asyncio.run(consume())
+    assert len(seen_before) == 6
+    # The first record arrives before the last page is requested
+    assert seen_before[0] < 6
+    assert len(stream.pages) == 6
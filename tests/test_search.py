@@ -0,0 +1,21 @@
+# Keyword search modes (services/db_service.py)
+
+from sqlalchemy.dialects import postgresql
+
+from services.db_service import _fulltext_keyword_filter, search_opportunity_rows, upsert_opportunities
+
+def test_fulltext_matches_partial_words_on_postgres():
+    compiled = _fulltext_keyword_filter(["scholar", "o'brien&!"], "postgresql").compile(dialect=postgresql.dialect())
+    assert "to_tsquery(" in str(compiled)
+    # Operator characters of the input are dropped, every word is a prefix
+    assert list(compiled.params.values()) == ["english", "'scholar':* & 'o':* & 'brien':*"]
+
+def test_fulltext_matches_partial_words_on_sqlite(db):
+    upsert_opportunities([
+        {"title": "Chevening Scholarship", "url": "https://chevening.org/apply"},
+        {"title": "Research Fellowship", "url": "https://example.org/fellowship"},
+    ], db)
+
+    rows = search_opportunity_rows(keyword="scholar", db=db, mode="fulltext", fields=("title",))
+
+    assert [row.title for row in rows] == ["Chevening Scholarship"]